@@ -1,25 +1,13 @@
 #!/bin/bash
 
 # Input files
-variant_list="all_variants.txt"
 output_matrix="binary_matrix.tsv"
+output_sparse="binary_matrix.npz"
+script_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
-# Add header row with VCF file names
-echo -e "Variant\t$(ls *.vcf | sed 's/.vcf//g' | tr '\n' '\t')" > $output_matrix
-
-# Process each variant
-while read -r chrom pos ref alt; do
-    variant="${chrom}_${pos}_${ref}_${alt}"
-    binary_row="$variant"
-    for vcf in *.vcf; do
-        if bcftools query -f '%CHROM\t%POS\t%REF\t%ALT\n' $vcf | grep -q -P "^${chrom}\t${pos}\t${ref}\t${alt}$"; then
-            binary_row="${binary_row}\t1"
-        else
-            binary_row="${binary_row}\t0"
-        fi
-    done
-    echo -e "$binary_row" >> $output_matrix
-done < $variant_list
-
-echo "Binary matrix saved to $output_matrix"
+# Read every VCF once and build the variant union and the presence/absence
+# matrix together (the sparse .npz is what pca_vcf.py loads; the TSV keeps the
+# old layout for other tools)
+python "$script_dir/../python/analyze/binary_matrix.py" --npz $output_sparse --tsv $output_matrix *.vcf
 
+echo "Binary matrix saved to $output_matrix and $output_sparse"
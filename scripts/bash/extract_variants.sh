@@ -10,8 +10,9 @@ for vcf in *.vcf; do
     grep -v '^#' $vcf | awk '{print $1"\t"$2"\t"$4"\t"$5}' >> $output_variant_list
 done
 
-# Remove duplicates
-sort $output_variant_list | uniq > $output_variant_list
+# Remove duplicates (sort -o can safely overwrite its own input, a plain
+# redirect would truncate the file before sort reads it)
+sort -u -o $output_variant_list $output_variant_list
 
 echo "Unique variants saved in $output_variant_list"
 
@@ -1,5 +1,6 @@
 from matplotlib_venn import venn3
 import matplotlib.pyplot as plt
+from intersections import combination_table, membership_from_sets, venn3_subsets
 
 # Load the variants from the extracted files (example paths)
 with open("mutect_variants.txt") as f:
@@ -9,20 +10,16 @@ with open("strelka_variants.txt") as f:
 with open("somaticsniper_variants.txt") as f:
     somaticsniper_variants = set(line.strip() for line in f)
 
-# Calculate overlaps
-only_mutect = mutect_variants - strelka_variants - somaticsniper_variants
-only_strelka = strelka_variants - mutect_variants - somaticsniper_variants
-only_somaticsniper = somaticsniper_variants - mutect_variants - strelka_variants
-mutect_strelka = mutect_variants & strelka_variants - somaticsniper_variants
-mutect_somaticsniper = mutect_variants & somaticsniper_variants - strelka_variants
-strelka_somaticsniper = strelka_variants & somaticsniper_variants - mutect_variants
-all_three = mutect_variants & strelka_variants & somaticsniper_variants
+# Calculate overlaps (every region of the diagram in one pass over the variants)
+matrix, names, _ = membership_from_sets({
+    "Mutect": mutect_variants,
+    "Strelka": strelka_variants,
+    "SomaticSniper": somaticsniper_variants,
+})
+overlaps = combination_table(matrix, names)
 
 # Create Venn diagram
-venn3(subsets=(len(only_mutect), len(only_strelka), len(mutect_strelka),
-               len(only_somaticsniper), len(mutect_somaticsniper), len(strelka_somaticsniper),
-               len(all_three)),
-      set_labels=('Mutect', 'Strelka', 'SomaticSniper'))
+venn3(subsets=venn3_subsets(overlaps, names), set_labels=tuple(names))
 
 # Customize and show plot
 plt.title("Overlap of Variants Called by Mutect, Strelka, and SomaticSniper")
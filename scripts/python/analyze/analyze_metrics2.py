@@ -1,80 +1,78 @@
+import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib_venn import venn3
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
 from scipy.stats import ttest_rel, ttest_ind
+from binary_matrix import load_binary_matrix
+from figures import (FigureSpec, figure_arguments, plot_boxplot, plot_heatmap, plot_histplot, plot_scatterplot,
+                     plot_venn3, run_figures)
+from pipeline_metrics import add_derived_metrics, add_pipeline_config
+from intersections import combination_table, group_membership, venn3_subsets
 
+args = figure_arguments("Compare pipeline metrics across mappers, callers and recalibration.")
 
 # Load the CSV file
 metrics_file = "/home/iaymergen/Bed_Filtered_VCFs/metrics_results_snps_and_indels.csv"
 metrics_data = pd.read_csv(metrics_file)
 
+# Pipeline x variant matrix written by binary_matrix.py (used for the Venn diagram)
+binary_matrix_file = "/home/iaymergen/Bed_Filtered_VCFs/binary_matrix.npz"
+
 # Add additional columns for configurations
-metrics_data["Mapper"] = metrics_data["File"].apply(lambda x: "bowtie" if "bowtie" in x else "bwa")
-metrics_data["Caller"] = metrics_data["File"].apply(
-    lambda x: "mutect" if "mutect" in x else "somaticsniper" if "somaticsniper" in x else "strelka"
-)
-metrics_data["Recalibration"] = metrics_data["File"].apply(lambda x: "WithBase" if "WithBase" in x else "NoBase")
-
-# Calculate Accuracy for SNPs and Indels
-metrics_data["SNP_Accuracy"] = metrics_data.apply(
-    lambda row: row["SNP_TP"] / (row["SNP_TP"] + row["SNP_FP"] + row["SNP_FN"]) if (row["SNP_TP"] + row["SNP_FP"] + row["SNP_FN"]) > 0 else 0,
-    axis=1
-)
-metrics_data["Indel_Accuracy"] = metrics_data.apply(
-    lambda row: row["Indel_TP"] / (row["Indel_TP"] + row["Indel_FP"] + row["Indel_FN"]) if (row["Indel_TP"] + row["Indel_FP"] + row["Indel_FN"]) > 0 else 0,
-    axis=1
-)
+add_pipeline_config(metrics_data, "File")
+
+# Calculate Precision, Recall, F1 and Accuracy for SNPs and Indels
+add_derived_metrics(metrics_data, ["SNP", "Indel"])
+
+figures = []
 
 # 1. Heatmaps for SNP and Indel F1-Scores
 for variant_type in ["SNP", "Indel"]:
     heatmap_data = metrics_data.pivot_table(values=f"{variant_type}_F1", index="Mapper", columns="Caller")
-    plt.figure(figsize=(10, 6))
-    sns.heatmap(heatmap_data, annot=True, cmap="coolwarm", fmt=".4f")
-    plt.title(f"{variant_type} F1-Scores by Mapper and Caller")
-    plt.tight_layout()
-    plt.show()
+    figures.append(FigureSpec(f"{variant_type.lower()}_f1_heatmap_by_mapper_and_caller", plot_heatmap, heatmap_data, dict(
+        annot=True, cmap="coolwarm", fmt=".4f", title=f"{variant_type} F1-Scores by Mapper and Caller",
+    )))
 
 # 2. Heatmaps for Accuracy (SNP and Indel)
 for variant_type in ["SNP", "Indel"]:
     heatmap_data = metrics_data.pivot_table(values=f"{variant_type}_Accuracy", index="Mapper", columns="Caller")
-    plt.figure(figsize=(10, 6))
-    sns.heatmap(heatmap_data, annot=True, cmap="coolwarm", fmt=".4f")
-    plt.title(f"{variant_type} Accuracy by Mapper and Caller")
-    plt.tight_layout()
-    plt.show()
+    figures.append(FigureSpec(f"{variant_type.lower()}_accuracy_heatmap_by_mapper_and_caller", plot_heatmap, heatmap_data, dict(
+        annot=True, cmap="coolwarm", fmt=".4f", title=f"{variant_type} Accuracy by Mapper and Caller",
+    )))
 
 # 3. Histograms for Metrics (Precision, Recall, F1, Accuracy)
 metrics = ["Precision", "Recall", "F1", "Accuracy"]
 for metric in metrics:
     for variant_type in ["SNP", "Indel"]:
-        plt.figure(figsize=(10, 6))
-        sns.histplot(data=metrics_data, x=f"{variant_type}_{metric}", hue="Caller", kde=True, palette="muted", bins=20)
-        plt.title(f"Distribution of {variant_type} {metric} Across Callers")
-        plt.xlabel(f"{variant_type} {metric}")
-        plt.ylabel("Frequency")
-        plt.tight_layout()
-        plt.show()
+        column = f"{variant_type}_{metric}"
+        figures.append(FigureSpec(f"{column.lower()}_histogram_by_caller", plot_histplot, metrics_data[[column, "Caller"]], dict(
+            x=column, hue="Caller", kde=True, palette="muted", bins=20,
+            title=f"Distribution of {variant_type} {metric} Across Callers", xlabel=f"{variant_type} {metric}", ylabel="Frequency",
+        )))
 
 # 4. Boxplots for Metrics (Precision, Recall, F1, Accuracy)
 for metric in metrics:
     for variant_type in ["SNP", "Indel"]:
-        plt.figure(figsize=(10, 6))
-        sns.boxplot(x="Caller", y=f"{variant_type}_{metric}", hue="Recalibration", data=metrics_data, palette="viridis")
-        plt.title(f"{variant_type} {metric} by Caller and Recalibration")
-        plt.ylabel(f"{variant_type} {metric}")
-        plt.xlabel("Variant Caller")
-        plt.tight_layout()
-        plt.show()
-
-# 5. Venn Diagram (replace with real data if available)
-plt.figure(figsize=(8, 8))
-venn3(subsets=(100, 80, 60, 30, 40, 20, 10), set_labels=("Bowtie", "BWA", "Strelka"))
-plt.title("Overlap of Variants Called by Pipelines")
-plt.tight_layout()
-plt.show()
+        column = f"{variant_type}_{metric}"
+        figures.append(FigureSpec(f"{column.lower()}_boxplot_by_caller_and_recalibration", plot_boxplot, metrics_data[["Caller", column, "Recalibration"]], dict(
+            x="Caller", y=column, hue="Recalibration", palette="viridis",
+            title=f"{variant_type} {metric} by Caller and Recalibration", ylabel=f"{variant_type} {metric}", xlabel="Variant Caller",
+        )))
+
+# 5. Venn Diagram (variants called by any Bowtie, any BWA and any Strelka pipeline)
+if os.path.exists(binary_matrix_file):
+    variant_matrix = load_binary_matrix(binary_matrix_file)
+    groups = {
+        label: [p for p in variant_matrix.pipelines if pattern in p.lower()]
+        for label, pattern in (("Bowtie", "bowtie"), ("BWA", "bwa"), ("Strelka", "strelka"))
+    }
+    group_matrix, group_names = group_membership(variant_matrix.matrix, variant_matrix.pipelines, groups)
+    overlaps = combination_table(group_matrix, group_names)
+    figures.append(FigureSpec("variant_overlap_venn", plot_venn3, venn3_subsets(overlaps, group_names), dict(
+        figsize=(8, 8), set_labels=tuple(group_names), title="Overlap of Variants Called by Pipelines",
+    )))
+else:
+    print(f"Skipping Venn diagram: {binary_matrix_file} not found (run binary_matrix.py first)")
 
 # 6. PCA Plot
 features = ["SNP_F1", "Indel_F1", "SNP_Precision", "SNP_Recall", "SNP_Accuracy", "Indel_Accuracy"]
@@ -90,11 +88,11 @@ pca_result = pca.fit_transform(pca_data_scaled)
 metrics_data["PCA1"] = pca_result[:, 0]
 metrics_data["PCA2"] = pca_result[:, 1]
 
-plt.figure(figsize=(10, 8))
-sns.scatterplot(x="PCA1", y="PCA2", hue="Caller", style="Recalibration", data=metrics_data, palette="deep")
-plt.title("PCA Plot of Pipeline Metrics")
-plt.tight_layout()
-plt.show()
+figures.append(FigureSpec("pipeline_metrics_pca", plot_scatterplot, metrics_data[["PCA1", "PCA2", "Caller", "Recalibration"]], dict(
+    figsize=(10, 8), x="PCA1", y="PCA2", hue="Caller", style="Recalibration", palette="deep", title="PCA Plot of Pipeline Metrics",
+)))
+
+run_figures(figures, args, "report_and_results/analyze_metrics2")
 
 # 7. Statistical Testing for SNP and Indel Metrics
 for metric in metrics:
@@ -109,9 +107,20 @@ for metric in metrics:
                 t_stat, p_value = ttest_rel(with_base, no_base)
                 print(f"Paired T-test: t_stat={t_stat:.4f}, p_value={p_value:.4f}")
             else:
-                # Independent t-test
-                min_length = min(len(with_base), len(no_base))
-                t_stat, p_value = ttest_ind(with_base[:min_length], no_base[:min_length], equal_var=False)
-                print(f"Independent T-test: t_stat={t_stat:.4f}, p_value={p_value:.4f}")
+                # Welch t-test on the full groups
+                t_stat, p_value = ttest_ind(with_base, no_base, equal_var=False)
+                print(f"Welch T-test: t_stat={t_stat:.4f}, p_value={p_value:.4f}")
         else:
             print("Not enough data points for statistical testing.")
+
+# 8. Variant-level bootstrap intervals and permutation tests (see stats_engine.py)
+if os.path.exists(binary_matrix_file):
+    import calculate_metrics
+    from stats_engine import variant_level_statistics
+
+    truth_keys = {variant_type: calculate_metrics.load_truth_variants(path) for variant_type, path in calculate_metrics.truth_sets().items()}
+    intervals, tests = variant_level_statistics(variant_matrix, truth_keys, replicates=2000)
+    print("\nVariant-level 95% bootstrap intervals:")
+    print(intervals.to_string(index=False))
+    print("\nVariant-level paired permutation tests:")
+    print(tests.to_string(index=False))
@@ -0,0 +1,227 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from synthetic_vcfs import generate_dataset
+from telemetry import peak_rss_mb, reset_peak_rss
+
+# Benchmark harness for the evaluation code on seeded synthetic VCFs. Every
+# stage runs in a fresh process so its peak RSS is its own; results are
+# appended to a JSON-lines history and compared with the recent runs of the
+# same stage, scale and host, failing when a stage regresses past a threshold.
+
+STAGES = ["load_variants", "compare", "binary_matrix", "pca", "plotting"]
+SCALES = {
+    "small": (10_000, 12),
+    "medium": (1_000_000, 12),
+    "large": (10_000_000, 12),
+    "wide": (10_000, 1_000),
+}
+DEFAULT_HISTORY = "benchmark_history.jsonl"
+BASELINE_RUNS = 5
+REGRESSION_METRICS = ["wall_s", "peak_rss_mb"]
+# Smallest absolute growth that can count as a regression, so that noise on
+# stages taking milliseconds does not trip the relative threshold
+REGRESSION_FLOORS = {"wall_s": 0.1, "peak_rss_mb": 16.0}
+
+
+def _cpu_seconds():
+    """CPU time of this process plus its finished children (e.g. figure rendering workers)."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def _load_all_keys(manifest):
+    import calculate_metrics
+    tests = [calculate_metrics.load_variants(path) for path in manifest["pipelines"]]
+    truths = [calculate_metrics.load_variants(path) for path in manifest["truth"].values()]
+    return tests, truths
+
+
+def _stage_load_variants(manifest):
+    import calculate_metrics
+
+    def run():
+        for path in manifest["pipelines"]:
+            calculate_metrics.load_variants(path)
+    return run, sum(manifest["records"])
+
+
+def _stage_compare(manifest):
+    import calculate_metrics
+    tests, truths = _load_all_keys(manifest)
+
+    def run():
+        for test in tests:
+            for truth in truths:
+                calculate_metrics.compare_variants(test, truth)
+    return run, sum(len(test) for test in tests) * len(truths)
+
+
+def _stage_binary_matrix(manifest):
+    from binary_matrix import build_binary_matrix
+
+    def run():
+        build_binary_matrix(manifest["pipelines"])
+    return run, sum(manifest["records"])
+
+
+def _stage_pca(manifest):
+    from binary_matrix import build_binary_matrix
+    from sparse_pca import sparse_pca
+    variant_matrix = build_binary_matrix(manifest["pipelines"])
+
+    def run():
+        sparse_pca(variant_matrix.matrix, n_components=2)
+    return run, variant_matrix.matrix.nnz
+
+
+def _stage_plotting(manifest):
+    import pandas as pd
+    import calculate_metrics
+    from binary_matrix import pipeline_name
+    from figures import FigureSpec, plot_boxplot, plot_heatmap, render_figures
+    from pipeline_metrics import add_derived_metrics, add_pipeline_config
+    tests, truths = _load_all_keys(manifest)
+    rows = []
+    for path, test in zip(manifest["pipelines"], tests):
+        row = {"File": pipeline_name(path)}
+        for variant_type, truth in zip(manifest["truth"], truths):
+            row.update(zip([f"{variant_type}_TP", f"{variant_type}_FP", f"{variant_type}_FN"], calculate_metrics.compare_variants(test, truth)))
+        rows.append(row)
+    metrics = add_derived_metrics(add_pipeline_config(pd.DataFrame(rows), "File"))
+    specs = []
+    for metric in ["Precision", "Recall", "F1"]:
+        for variant_type in manifest["truth"]:
+            column = f"{variant_type}_{metric}"
+            specs.append(FigureSpec(f"{column}_heatmap", plot_heatmap, metrics.pivot_table(values=column, index="Mapper", columns="Caller"),
+                                    dict(annot=True, fmt=".4f", title=column)))
+            specs.append(FigureSpec(f"{column}_boxplot", plot_boxplot, metrics[["Caller", column, "Recalibration"]],
+                                    dict(x="Caller", y=column, hue="Recalibration", title=column)))
+    out_dir = tempfile.mkdtemp(prefix="benchmark-figures-")
+
+    def run():
+        render_figures(specs, out_dir, force=True)
+    return run, len(specs)
+
+
+def run_stage(stage, manifest):
+    """Time one stage (after its untimed setup) in the current process; return its measurements."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        run, records = globals()[f"_stage_{stage}"](manifest)
+        rss_scope = "stage" if reset_peak_rss() else "process"
+        wall_start, cpu_start = time.perf_counter(), _cpu_seconds()
+        run()
+        wall, cpu = time.perf_counter() - wall_start, _cpu_seconds() - cpu_start
+    input_bytes = sum(os.path.getsize(path) for path in manifest["pipelines"])
+    return {
+        "stage": stage, "wall_s": wall, "cpu_s": cpu, "records": records,
+        "records_per_s": records / wall if wall > 0 else None, "bytes": input_bytes,
+        "peak_rss_mb": peak_rss_mb(), "rss_scope": rss_scope,
+    }
+
+
+def run_stage_isolated(stage, manifest):
+    """Run a stage in a fresh child process so that its peak RSS and imports are its own."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_stage, stage, manifest).result()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(path):
+    """Return the entries of a benchmark history file (oldest first)."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def find_regressions(entry, history, threshold, baseline_runs=BASELINE_RUNS):
+    """Compare an entry with the median of the last runs of the same stage, scale and host.
+
+    Returns one message per metric that grew by more than `threshold` (a
+    fraction) and by more than its REGRESSION_FLOORS amount.
+    """
+    same = [
+        past for past in history
+        if past["stage"] == entry["stage"] and past["scale"] == entry["scale"] and past["host"] == entry["host"]
+    ][-baseline_runs:]
+    if not same:
+        return []
+    messages = []
+    for metric in REGRESSION_METRICS:
+        baseline = statistics.median(past[metric] for past in same)
+        growth = entry[metric] - baseline
+        if baseline > 0 and growth > baseline * threshold and growth > REGRESSION_FLOORS[metric]:
+            messages.append(f"{entry['stage']}: {metric} {entry[metric]:.3f} vs baseline {baseline:.3f} (+{entry[metric] / baseline - 1:.0%})")
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation stages on synthetic VCFs.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="preset (records per VCF, pipelines)")
+    parser.add_argument("--records", type=int, help="records per pipeline VCF (overrides --scale)")
+    parser.add_argument("--pipelines", type=int, help="number of pipelines (overrides --scale)")
+    parser.add_argument("--seed", type=int, default=0, help="generator seed (default: %(default)s)")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated stages (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest is recorded")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "variant-benchmark"),
+                        help="where generated datasets are kept and reused (default: %(default)s)")
+    parser.add_argument("--history", help=f"JSON-lines history file (default: {DEFAULT_HISTORY} in --data-dir)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed growth over the baseline (default: %(default)s)")
+    parser.add_argument("--no-record", action="store_true", help="compare with the history without appending to it")
+    args = parser.parse_args()
+
+    records, pipelines = SCALES[args.scale]
+    records = args.records or records
+    pipelines = args.pipelines or pipelines
+    stages = args.stages.split(",")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    dataset_dir = os.path.join(args.data_dir, f"r{records}_p{pipelines}_s{args.seed}")
+    manifest = generate_dataset(dataset_dir, records, pipelines, args.seed)
+    args.history = args.history or os.path.join(args.data_dir, DEFAULT_HISTORY)
+    history = read_history(args.history)
+    scale = {"records": records, "pipelines": pipelines, "seed": args.seed}
+    common = {"time": time.time(), "commit": _git_commit(), "host": platform.node(), "python": platform.python_version(), "scale": scale}
+
+    regressions = []
+    entries = []
+    for stage in stages:
+        runs = [run_stage_isolated(stage, manifest) for _ in range(args.repeat)]
+        entry = {**common, **min(runs, key=lambda result: result["wall_s"])}
+        regressions += find_regressions(entry, history, args.threshold)
+        entries.append(entry)
+        rate = f"{entry['records_per_s']:,.0f} records/s" if entry["records_per_s"] else "-"
+        print(f"{stage:<14} wall {entry['wall_s']:8.3f}s  cpu {entry['cpu_s']:8.3f}s  {rate:>22}  peak RSS {entry['peak_rss_mb']:8.1f} MB")
+
+    if not args.no_record:
+        with open(args.history, "a") as handle:
+            handle.writelines(json.dumps(entry) + "\n" for entry in entries)
+        print(f"Appended {len(entries)} results to {args.history}")
+    if regressions:
+        print("Regressions past the threshold:")
+        for message in regressions:
+            print(f"  {message}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
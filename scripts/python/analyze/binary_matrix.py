@@ -0,0 +1,150 @@
+import argparse
+import glob
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+import telemetry
+from vcf_scanner import scan_variant_columns
+
+# Pipeline x variant presence/absence matrix built from a single read of every
+# pipeline VCF. Replaces extract_variants.sh + create_binary_matrix.sh, which
+# re-ran bcftools over every VCF for every variant.
+
+
+def pipeline_name(vcf_path):
+    """Return the pipeline name of a VCF (its file name without the .vcf/.vcf.gz suffix)."""
+    name = os.path.basename(vcf_path)
+    for suffix in (".gz", ".bgz", ".vcf"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    return name
+
+
+class VariantMatrix:
+    """Sparse pipeline x variant membership matrix with its pipeline names and variant index."""
+
+    def __init__(self, matrix, pipelines, variants):
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.int8)
+        self.pipelines = list(pipelines)
+        # DataFrame with one row per variant: key, CHROM, POS, REF, ALT
+        self.variants = variants.reset_index(drop=True)
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def variant_labels(self):
+        """Return the CHROM_POS_REF_ALT labels used by binary_matrix.tsv."""
+        v = self.variants
+        # A missing ALT is kept as "" but written as "." (as bcftools query prints it).
+        alt = v["ALT"].where(v["ALT"] != "", ".")
+        return (v["CHROM"] + "_" + v["POS"].astype(str) + "_" + v["REF"] + "_" + alt).to_numpy()
+
+    def to_frame(self):
+        """Return the dense variant x pipeline DataFrame (the binary_matrix.tsv layout)."""
+        return pd.DataFrame(self.matrix.T.toarray(), index=pd.Index(self.variant_labels(), name="Variant"), columns=self.pipelines)
+
+    def save(self, path):
+        """Save the matrix and its index to a compressed .npz file."""
+        v = self.variants
+        np.savez_compressed(
+            path,
+            indptr=self.matrix.indptr, indices=self.matrix.indices, shape=np.array(self.matrix.shape),
+            pipelines=np.array(self.pipelines), keys=v["key"].to_numpy(), chrom=v["CHROM"].to_numpy(dtype=str),
+            pos=v["POS"].to_numpy(), ref=v["REF"].to_numpy(dtype=str), alt=v["ALT"].to_numpy(dtype=str),
+        )
+
+    def write_tsv(self, path, chunk_size=100_000):
+        """Write the matrix in the binary_matrix.tsv layout (one row per variant, one column per pipeline)."""
+        labels = self.variant_labels()
+        by_variant = self.matrix.T.tocsr()
+        with open(path, "w") as handle:
+            handle.write("Variant\t" + "\t".join(self.pipelines) + "\n")
+            for start in range(0, len(labels), chunk_size):
+                block = by_variant[start:start + chunk_size].toarray()
+                rows = ["\t".join(map(str, row)) for row in block]
+                handle.writelines(f"{label}\t{row}\n" for label, row in zip(labels[start:start + chunk_size], rows))
+
+
+def load_binary_matrix(path):
+    """Load a VariantMatrix saved with VariantMatrix.save()."""
+    with np.load(path) as data:
+        shape = tuple(data["shape"])
+        matrix = sparse.csr_matrix((np.ones(len(data["indices"]), dtype=np.int8), data["indices"], data["indptr"]), shape=shape)
+        variants = pd.DataFrame({
+            "key": data["keys"], "CHROM": data["chrom"].astype(object), "POS": data["pos"],
+            "REF": data["ref"].astype(object), "ALT": data["alt"].astype(object),
+        })
+        return VariantMatrix(matrix, data["pipelines"].tolist(), variants)
+
+
+def build_binary_matrix(vcf_paths, pipelines=None):
+    """Read each VCF once and build the variant union and the pipeline x variant membership together."""
+    if not vcf_paths:
+        raise ValueError("No VCF files to build a binary matrix from")
+    pipelines = pipelines or [pipeline_name(path) for path in vcf_paths]
+    file_columns = []
+    for path in vcf_paths:
+        print(f"Reading variants from {path}")
+        with telemetry.stage("read_variant_columns", path) as stage:
+            file_columns.append(scan_variant_columns(path))
+            stage.add(records=len(file_columns[-1][0]))
+    return matrix_from_columns(file_columns, pipelines)
+
+
+def matrix_from_columns(file_columns, pipelines):
+    """Build a VariantMatrix from one (keys, CHROM, POS, REF, ALT) column tuple per pipeline."""
+    with telemetry.stage("binary_matrix") as stage:
+        variant_matrix = _matrix_from_columns(file_columns, pipelines)
+        stage.add(records=variant_matrix.matrix.nnz)
+    return variant_matrix
+
+
+def _matrix_from_columns(file_columns, pipelines):
+    file_keys = []
+    columns = {"CHROM": [], "POS": [], "REF": [], "ALT": []}
+    for keys, chroms, positions, refs, alts in file_columns:
+        file_keys.append(np.asarray(keys, dtype=np.uint64))
+        for name, values in zip(columns, (chroms, positions, refs, alts)):
+            columns[name].append(np.asarray(values, dtype=object if name != "POS" else np.int64))
+
+    # One sort of all keys gives the union; the first occurrence of each key provides its columns.
+    union_keys, first = np.unique(np.concatenate(file_keys), return_index=True)
+    variants = pd.DataFrame({"key": union_keys})
+    for name, values in columns.items():
+        variants[name] = np.concatenate(values)[first]
+
+    rows = np.concatenate([np.full(len(np.unique(keys)), row) for row, keys in enumerate(file_keys)])
+    cols = np.concatenate([np.searchsorted(union_keys, np.unique(keys)) for keys in file_keys])
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(len(file_keys), len(union_keys)))
+    print(f"Built a {matrix.shape[0]} x {matrix.shape[1]} binary matrix with {matrix.nnz} calls")
+    return VariantMatrix(matrix, pipelines, variants)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the pipeline x variant presence/absence matrix.")
+    parser.add_argument("vcfs", nargs="*", help="pipeline VCFs (default: *.vcf in the current directory)")
+    parser.add_argument("--store", help="read the pipelines from a variant_store.py dataset instead of VCFs")
+    parser.add_argument("--npz", default="binary_matrix.npz", help="sparse matrix output")
+    parser.add_argument("--tsv", help="also write the dense binary_matrix.tsv layout")
+    telemetry.add_telemetry_arguments(parser)
+    args = parser.parse_args()
+    telemetry.enable_from_arguments(args)
+
+    if args.store:
+        from variant_store import store_binary_matrix
+        variant_matrix = store_binary_matrix(args.store, [pipeline_name(path) for path in args.vcfs] or None)
+    else:
+        vcf_paths = args.vcfs or sorted(glob.glob("*.vcf"))
+        variant_matrix = build_binary_matrix(vcf_paths)
+    variant_matrix.save(args.npz)
+    print(f"Binary matrix saved to {args.npz}")
+    if args.tsv:
+        variant_matrix.write_tsv(args.tsv)
+        print(f"Binary matrix saved to {args.tsv}")
+    telemetry.finish()
+
+
+if __name__ == "__main__":
+    main()
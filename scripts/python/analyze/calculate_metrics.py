@@ -1,85 +1,415 @@
-import os
-import vcfpy  # Use vcfpy instead of vcf
-import pandas as pd
-
-# Define paths to ground truth files
-vcf_directory = "/home/iaymergen/Bed_Filtered_VCFs"
-ground_truth_snps = "/home/iaymergen/Bed_Filtered_VCFs/filtered_snps.vcf.gz"
-ground_truth_indels = "/home/iaymergen/Bed_Filtered_VCFs/filtered_indels.vcf.gz"
-
-# List of files to process
-files_to_process = [
-    "final_bowtie_mutect_nobase.vcf.recode.vcf",
-    "final_bowtie_mutect_Withbase.vcf.recode.vcf",
-    "final_bowtie_somaticsniper_no_Base.vcf",
-    "final_bowtie_somaticsniper_with_Base.vcf",
-    "final_bowtie_strelka_nobase.vcf.recode.vcf",
-    "final_bowtie_strelka_Withbase.vcf.recode.vcf",
-    "final_bwa_mutect_noBase.vcf.recode.vcf",
-    "final_bwa_mutect_WithBase.vcf.recode.vcf",
-    "final_bwa_somaticsniper_no_Base.vcf",
-    "final_bwa_somaticsniper_withBase.vcf",
-    "final_bwa_strelka_noBase.vcf.recode.vcf",
-    "final_bwa_strelka_WithBase.vcf.recode.vcf",
-]
-
-def load_variants(vcf_path):
-    """Load variants from a VCF file into a set."""
-    print(f"Loading variants from: {vcf_path}")
-    variants = set()
-    try:
-        with vcfpy.Reader.from_path(vcf_path) as reader:
-            for record in reader:
-                variants.add((record.CHROM, record.POS, record.REF, tuple(str(alt) for alt in record.ALT)))
-    except Exception as e:
-        print(f"Error while loading variants from {vcf_path}: {e}")
-    print(f"Loaded {len(variants)} variants from {vcf_path}")
-    return variants
-
-def calculate_metrics(test_vcf_path, truth_vcf_path):
-    """Calculate TP, FP, FN for a test VCF file against the ground truth."""
-    print(f"Calculating metrics for: {test_vcf_path}")
-    test_variants = load_variants(test_vcf_path)
-    truth_variants = load_variants(truth_vcf_path)
-
-    tp = len(test_variants & truth_variants)
-    fp = len(test_variants - truth_variants)
-    fn = len(truth_variants - test_variants)
-
-    print(f"Metrics for {test_vcf_path}: TP={tp}, FP={fp}, FN={fn}")
-
-    precision = tp / (tp + fp) if (tp + fp) > 0 else 0
-    recall = tp / (tp + fn) if (tp + fn) > 0 else 0
-    f1_score = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-
-    print(f"Precision={precision:.3f}, Recall={recall:.3f}, F1-Score={f1_score:.3f}")
-    return tp, fp, fn, precision, recall, f1_score
-
-# Analyze each pipeline for SNPs and Indels
-results = []
-print("Starting analysis of VCF files...")
-for file in files_to_process:
-    test_vcf_path = os.path.join(vcf_directory, file)
-    print(f"Processing file: {file}")
-
-    # Calculate metrics for SNPs
-    print(f"Calculating SNP metrics for {file}")
-    snp_tp, snp_fp, snp_fn, snp_precision, snp_recall, snp_f1 = calculate_metrics(test_vcf_path, ground_truth_snps)
-
-    # Calculate metrics for Indels
-    print(f"Calculating Indel metrics for {file}")
-    indel_tp, indel_fp, indel_fn, indel_precision, indel_recall, indel_f1 = calculate_metrics(test_vcf_path, ground_truth_indels)
-
-    results.append({
-        "File": file,
-        "SNP_TP": snp_tp, "SNP_FP": snp_fp, "SNP_FN": snp_fn,
-        "SNP_Precision": snp_precision, "SNP_Recall": snp_recall, "SNP_F1": snp_f1,
-        "Indel_TP": indel_tp, "Indel_FP": indel_fp, "Indel_FN": indel_fn,
-        "Indel_Precision": indel_precision, "Indel_Recall": indel_recall, "Indel_F1": indel_f1
-    })
-
-# Save results to a CSV
-print("Saving results to CSV...")
-df = pd.DataFrame(results)
-df.to_csv(os.path.join(vcf_directory, "metrics_results_snps_and_indels.csv"), index=False)
-print("Metrics saved to metrics_results_snps_and_indels.csv")
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import telemetry
+from merge_compare import merge_compare
+from normalize import ReferenceFasta, reference_state, scan_normalized_keys
+from regions import RegionIndex
+from results_cache import ResultsCache
+from truth_cache import atomic_write, load_truth_keys
+from variant_keys import CONTIG_BITS, POS_BITS, ALLELE_BITS, KEY_SCHEME_VERSION, contains, to_key_array
+from vcf_scanner import scan_keys
+
+# Define paths to ground truth files
+vcf_directory = "/home/iaymergen/Bed_Filtered_VCFs"
+ground_truth_snps = "/home/iaymergen/Bed_Filtered_VCFs/filtered_snps.vcf.gz"
+ground_truth_indels = "/home/iaymergen/Bed_Filtered_VCFs/filtered_indels.vcf.gz"
+
+# Directory for the parsed truth-set caches (None keeps them next to the truth VCFs)
+truth_cache_dir = None
+
+# Columnar store written by variant_store.py; when set, pipeline and truth keys are
+# read from its partitions (by VCF file name) instead of parsing the VCFs
+variant_store_dir = None
+
+# Indexed reference FASTA (uncompressed; the .fai is built if missing). When set, keys
+# are extracted with multi-allelic records split and indels trimmed and left-aligned,
+# so differently represented calls match; None compares the records as written
+reference_fasta = None
+
+# Comparison engine: "keys" compares in-memory key arrays, "merge" streams both
+# VCFs through a sorted merge join with bounded memory
+comparison_engine = "keys"
+
+# With the merge engine, write the TP/FP/FN records of every comparison here (None disables)
+record_output_dir = None
+
+# BED file(s) restricting the evaluation to target regions, applied in-process to
+# both the pipeline and the truth variants (None evaluates everything)
+target_regions = None
+
+# Stratification BEDs as {stratum name: BED path}; per-stratum metrics are written
+# to metrics_results_by_region.csv alongside the main table
+stratification_regions = {}
+
+# Cache of per-pipeline results keyed by the content of every input, so re-runs only
+# evaluate new or changed VCFs (None disables; see results_cache.py to list/evict)
+results_cache_dir = os.path.join(vcf_directory, ".metrics_cache")
+
+# Number of worker processes for the (pipeline x truth set) jobs; 1 runs serially,
+# None uses every core
+num_workers = 1
+
+# Contig-sharded evaluation (see sharded_eval.py): None evaluates each VCF as a whole,
+# "contig" splits the genome per contig and an integer into fixed-size shards of that
+# many bp. Shards run as separate jobs on the num_workers processes. Plain VCFs get a
+# bgzipped, tabix-indexed copy in shard_index_dir (None: next to the VCF).
+shard_size = None
+shard_index_dir = None
+
+# Also write the metrics of every shard to metrics_results_by_shard.csv
+shard_table = False
+
+# Regions ("chr1", "chr1:1-5000000") to restrict the sharded evaluation to (None: whole genome)
+shard_regions = None
+
+# JSON-lines file receiving per-stage telemetry (wall/CPU time, records, bytes read,
+# peak RSS) and, next to it, a summary CSV; None disables collection
+telemetry_path = None
+
+# Stage to profile on every run while telemetry is on ("load_variants", "compare",
+# ...) and the profiler: "cprofile" (.prof files) or "sample" (folded stacks)
+profile_stage = None
+profile_mode = "cprofile"
+
+# List of files to process
+files_to_process = [
+    "final_bowtie_mutect_nobase.vcf.recode.vcf",
+    "final_bowtie_mutect_Withbase.vcf.recode.vcf",
+    "final_bowtie_somaticsniper_no_Base.vcf",
+    "final_bowtie_somaticsniper_with_Base.vcf",
+    "final_bowtie_strelka_nobase.vcf.recode.vcf",
+    "final_bowtie_strelka_Withbase.vcf.recode.vcf",
+    "final_bwa_mutect_noBase.vcf.recode.vcf",
+    "final_bwa_mutect_WithBase.vcf.recode.vcf",
+    "final_bwa_somaticsniper_no_Base.vcf",
+    "final_bwa_somaticsniper_withBase.vcf",
+    "final_bwa_strelka_noBase.vcf.recode.vcf",
+    "final_bwa_strelka_WithBase.vcf.recode.vcf",
+]
+
+def load_store_variants(vcf_path, source="pipeline"):
+    """Load the keys of a VCF from its partition in the variant store, re-ingesting it if the VCF changed."""
+    if reference_fasta:
+        raise ValueError("The variant store holds the records as written; normalization needs variant_store_dir = None")
+    from binary_matrix import pipeline_name
+    from variant_store import ingest_vcf, store_keys
+    with telemetry.stage("load_store_variants", vcf_path) as stage:
+        # A no-op while the partition matches the VCF's size and mtime.
+        ingest_vcf(vcf_path, variant_store_dir, source)
+        variants = store_keys(variant_store_dir, pipeline_name(vcf_path), source)
+        stage.add(records=len(variants))
+    print(f"Loaded {len(variants)} variants of {vcf_path} from the variant store")
+    return variants
+
+@lru_cache(maxsize=None)
+def _open_reference(fasta_path, mtime_ns):
+    return ReferenceFasta(fasta_path)
+
+def load_reference(fasta_path):
+    """Open (once per process, again if the file changed) the memory-mapped reference used for normalization."""
+    return _open_reference(fasta_path, os.stat(fasta_path).st_mtime_ns)
+
+def extract_keys(vcf_path):
+    """Return the keys of a VCF (unsorted, with duplicates), normalized if reference_fasta is set."""
+    if reference_fasta:
+        return scan_normalized_keys(vcf_path, load_reference(reference_fasta))
+    return scan_keys(vcf_path)
+
+def truth_cache_tag():
+    """Return the truth cache tag of the current key extraction (None for the records as written)."""
+    if not reference_fasta:
+        return None
+    path_hash = hashlib.sha256(os.path.abspath(reference_fasta).encode()).hexdigest()[:12]
+    return f"norm-{os.path.basename(reference_fasta)}-{path_hash}"
+
+def reference_identity():
+    """Return the path, size/mtime (FASTA and .fai) and normalization version of reference_fasta (None if unset)."""
+    if not reference_fasta:
+        return None
+    load_reference(reference_fasta)  # builds the .fai if it is missing
+    return {"path": os.path.abspath(reference_fasta), **reference_state(reference_fasta)}
+
+def read_variants(vcf_path):
+    """Load variants from a VCF file into a sorted array of encoded keys, raising on read or parse errors."""
+    print(f"Loading variants from: {vcf_path}")
+    with telemetry.stage("load_variants", vcf_path) as stage:
+        with telemetry.stage("scan_keys", vcf_path) as scan:
+            variants = extract_keys(vcf_path)
+            scan.add(records=len(variants))
+        with telemetry.stage("key_set", vcf_path) as key_set:
+            key_set.add(records=len(variants))
+            variants = to_key_array(variants)
+        stage.add(records=len(variants))
+    print(f"Loaded {len(variants)} variants from {vcf_path}")
+    return variants
+
+def try_load_variants(vcf_path):
+    """Return the sorted keys of a VCF and True, or an empty array and False if the file cannot be read."""
+    try:
+        if variant_store_dir:
+            return load_store_variants(vcf_path), True
+        return read_variants(vcf_path), True
+    except Exception as e:
+        print(f"Error while loading variants from {vcf_path}: {e}")
+        return to_key_array([]), False
+
+def load_variants(vcf_path):
+    """Load variants from a VCF file into a sorted array of encoded keys (empty if the file cannot be read)."""
+    return try_load_variants(vcf_path)[0]
+
+def load_truth_variants(truth_vcf_path):
+    """Load the keys of a truth VCF from its on-disk cache, parsing it only if the cache is stale."""
+    if variant_store_dir:
+        return load_store_variants(truth_vcf_path, "truth")
+    with telemetry.stage("load_truth_variants", truth_vcf_path) as stage:
+        variants = load_truth_keys(truth_vcf_path, read_variants, truth_cache_dir, truth_cache_tag(), reference_identity())
+        stage.add(records=len(variants))
+    return variants
+
+def compare_variants(test_variants, truth_variants):
+    """Return TP, FP, FN for two sorted arrays of unique variant keys."""
+    with telemetry.stage("compare") as stage:
+        stage.add(records=len(test_variants) + len(truth_variants))
+        tp = int(contains(truth_variants, test_variants).sum())
+    return tp, len(test_variants) - tp, len(truth_variants) - tp
+
+def record_output_prefix(test_vcf_path, truth_vcf_path):
+    """Return the path prefix for the TP/FP/FN record files of one comparison."""
+    if record_output_dir is None:
+        return None
+    os.makedirs(record_output_dir, exist_ok=True)
+    name = f"{os.path.basename(test_vcf_path)}.vs.{os.path.basename(truth_vcf_path)}"
+    return os.path.join(record_output_dir, name)
+
+@lru_cache(maxsize=None)
+def load_region_index(*bed_paths):
+    """Build (once per process) the interval index of one or more BED files."""
+    index = RegionIndex.from_bed(*bed_paths)
+    print(f"Indexed {len(index)} regions from {', '.join(bed_paths)}")
+    return index
+
+def target_mask(variants):
+    """Return a boolean mask of the variant keys inside target_regions (all True if no targets are set)."""
+    if not target_regions:
+        return np.ones(len(variants), dtype=bool)
+    bed_paths = (target_regions,) if isinstance(target_regions, str) else tuple(target_regions)
+    return load_region_index(*bed_paths).contains_keys(variants)
+
+def restrict_to_targets(variants):
+    """Keep only the variant keys inside target_regions (all of them if no targets are set)."""
+    if not target_regions:
+        return variants
+    return variants[target_mask(variants)]
+
+def metrics_from_counts(tp, fp, fn):
+    """Return TP, FP, FN with the precision, recall and F1-score derived from them."""
+    precision = tp / (tp + fp) if (tp + fp) > 0 else 0
+    recall = tp / (tp + fn) if (tp + fn) > 0 else 0
+    f1_score = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+    return tp, fp, fn, precision, recall, f1_score
+
+def stratified_counts(test_variants, truth_variants):
+    """Return {stratum: (TP, FP, FN)} for every stratification BED, reusing one TP/FN classification."""
+    test_is_tp = contains(truth_variants, test_variants)
+    truth_is_fn = ~contains(test_variants, truth_variants)
+    counts = {}
+    for stratum, bed_path in stratification_regions.items():
+        index = load_region_index(bed_path)
+        in_test = index.contains_keys(test_variants)
+        in_truth = index.contains_keys(truth_variants)
+        tp = int((test_is_tp & in_test).sum())
+        counts[stratum] = (tp, int(in_test.sum()) - tp, int((truth_is_fn & in_truth).sum()))
+    return counts
+
+def evaluate(test_vcf_path, truth_vcf_path, test_variants=None):
+    """Return the overall metrics and the {stratum: metrics} of a test VCF against one truth set, and whether it could be read."""
+    if comparison_engine not in ("keys", "merge"):
+        raise ValueError(f"Unknown comparison_engine {comparison_engine!r}; use \"keys\" or \"merge\"")
+    print(f"Calculating metrics for: {test_vcf_path}")
+    strata = {}
+    loaded = True
+    with telemetry.stage("calculate_metrics", test_vcf_path) as stage:
+        if comparison_engine == "merge":
+            if target_regions or stratification_regions or reference_fasta:
+                raise ValueError("Region restriction, stratification and normalization need comparison_engine = \"keys\"")
+            output_prefix = record_output_prefix(test_vcf_path, truth_vcf_path)
+            try:
+                tp, fp, fn = merge_compare(test_vcf_path, truth_vcf_path, output_prefix)
+            except Exception as e:
+                # Count an unreadable VCF as an empty test set, as the keys engine does (an unreadable truth VCF still raises).
+                print(f"Error while loading variants from {test_vcf_path}: {e}")
+                tp, fp, fn = compare_variants(to_key_array([]), load_truth_variants(truth_vcf_path))
+                loaded = False
+        else:
+            if test_variants is None:
+                test_variants, loaded = try_load_variants(test_vcf_path)
+            test_variants = restrict_to_targets(test_variants)
+            truth_variants = restrict_to_targets(load_truth_variants(truth_vcf_path))
+            tp, fp, fn = compare_variants(test_variants, truth_variants)
+            if stratification_regions:
+                strata = {stratum: metrics_from_counts(*counts) for stratum, counts in stratified_counts(test_variants, truth_variants).items()}
+        stage.add(records=tp + fp)
+
+    print(f"Metrics for {test_vcf_path}: TP={tp}, FP={fp}, FN={fn}")
+    metrics = metrics_from_counts(tp, fp, fn)
+    print(f"Precision={metrics[3]:.3f}, Recall={metrics[4]:.3f}, F1-Score={metrics[5]:.3f}")
+    return metrics, strata, loaded
+
+def calculate_metrics(test_vcf_path, truth_vcf_path, test_variants=None):
+    """Calculate TP, FP, FN for a test VCF file against the ground truth."""
+    return evaluate(test_vcf_path, truth_vcf_path, test_variants)[0]
+
+def truth_sets():
+    """Return the truth VCF of each variant type, in output column order."""
+    return {"SNP": ground_truth_snps, "Indel": ground_truth_indels}
+
+def make_row(file, metrics_by_type, region=None, region_column="Region"):
+    """Build one metrics_results_snps_and_indels.csv row from per-variant-type metrics."""
+    row = {"File": file}
+    if region is not None:
+        row[region_column] = region
+    for variant_type, (tp, fp, fn, precision, recall, f1_score) in metrics_by_type.items():
+        row.update({
+            f"{variant_type}_TP": tp, f"{variant_type}_FP": fp, f"{variant_type}_FN": fn,
+            f"{variant_type}_Precision": precision, f"{variant_type}_Recall": recall, f"{variant_type}_F1": f1_score,
+        })
+    return row
+
+def make_rows(file, evaluations):
+    """Turn the {variant type: (metrics, strata)} of one pipeline into its overall row and per-region rows."""
+    row = make_row(file, {variant_type: metrics for variant_type, (metrics, _) in evaluations.items()})
+    regions = dict.fromkeys(stratum for _, strata in evaluations.values() for stratum in strata)
+    region_rows = [
+        make_row(file, {variant_type: strata[stratum] for variant_type, (_, strata) in evaluations.items()}, stratum)
+        for stratum in regions
+    ]
+    return row, region_rows
+
+def evaluate_file(file):
+    """Evaluate one pipeline against every truth set, scanning its VCF once.
+
+    Returns its (row, region rows) and whether its VCF could be read.
+    """
+    test_vcf_path = os.path.join(vcf_directory, file)
+    print(f"Processing file: {file}")
+    test_variants, loaded = try_load_variants(test_vcf_path) if comparison_engine == "keys" else (None, True)
+    evaluations = {}
+    for variant_type, truth_vcf_path in truth_sets().items():
+        print(f"Calculating {variant_type} metrics for {file}")
+        metrics, strata, test_loaded = evaluate(test_vcf_path, truth_vcf_path, test_variants)
+        evaluations[variant_type] = metrics, strata
+        loaded = loaded and test_loaded
+    return make_rows(file, evaluations), loaded
+
+def evaluate_serial(files):
+    """Evaluate each pipeline against every truth set, one after another."""
+    return [evaluate_file(file) for file in files]
+
+def evaluate_parallel(files, workers):
+    """Evaluate the pipelines on a process pool, one job per pipeline.
+
+    Truth caches are built up front so every worker maps the same read-only
+    key files instead of parsing or copying the truth sets.
+    """
+    if comparison_engine == "keys":
+        for truth_vcf_path in truth_sets().values():
+            load_truth_variants(truth_vcf_path)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(evaluate_file, files))
+
+def region_files():
+    """Return every BED file that influences the results, by role."""
+    bed_paths = {}
+    if target_regions:
+        for i, bed_path in enumerate((target_regions,) if isinstance(target_regions, str) else target_regions):
+            bed_paths[f"target_{i}"] = bed_path
+    for stratum, bed_path in stratification_regions.items():
+        bed_paths[f"stratum_{stratum}"] = bed_path
+    return bed_paths
+
+def matching_parameters():
+    """Return the settings that change the computed rows (part of every results cache key)."""
+    parameters = {"key_layout": [CONTIG_BITS, POS_BITS, ALLELE_BITS], "key_scheme": KEY_SCHEME_VERSION,
+                  "strata": sorted(stratification_regions)}
+    if shard_size:
+        parameters["shards"] = [shard_size, shard_regions, shard_table]
+    if reference_fasta:
+        parameters["reference"] = reference_identity()
+    return parameters
+
+def evaluate_files(files, workers):
+    """Evaluate the given pipelines and return their ((row, region rows), loaded) in order."""
+    if not files:
+        return []
+    if shard_size:
+        from sharded_eval import evaluate_files as evaluate_sharded_files
+        print(f"Evaluating {len(files)} pipelines in shards with {workers} worker processes")
+        return evaluate_sharded_files(files, workers)
+    if workers > 1:
+        print(f"Evaluating {len(files)} pipelines with {workers} worker processes")
+        return evaluate_parallel(files, workers)
+    return evaluate_serial(files)
+
+def evaluate_cached(files, workers, cache):
+    """Reuse cached rows for unchanged inputs and evaluate only new or changed pipelines.
+
+    Missing VCFs are evaluated (and reported) without a cache key, and rows
+    from VCFs that could not be read are never stored.
+    """
+    keys = {
+        file: cache.entry_key(os.path.join(vcf_directory, file), truth_sets(), region_files(), matching_parameters())
+        for file in files
+        if os.path.exists(os.path.join(vcf_directory, file))
+    }
+    cached = {file: cache.get(keys[file]) if file in keys else None for file in files}
+    pending = [file for file in files if cached[file] is None]
+    print(f"Reusing cached results for {len(files) - len(pending)} pipelines, evaluating {len(pending)}")
+    for file, (rows, loaded) in zip(pending, evaluate_files(pending, workers)):
+        if loaded and file in keys:
+            cache.put(keys[file], rows, file)
+        cached[file] = rows
+    cache.save()
+    return [tuple(cached[file]) for file in files]
+
+def write_csv(df, path):
+    """Write a DataFrame to CSV atomically, so readers never see a half-written table."""
+    with telemetry.stage("write_csv", path) as stage:
+        stage.add(records=len(df))
+        atomic_write(path, lambda handle: handle.write(df.to_csv(index=False).encode()))
+
+def main():
+    # Analyze each pipeline for SNPs and Indels
+    print("Starting analysis of VCF files...")
+    if telemetry_path:
+        telemetry.enable(telemetry_path, profile_stage, profile_mode)
+    workers = num_workers or os.cpu_count()
+    if results_cache_dir:
+        rows = evaluate_cached(files_to_process, workers, ResultsCache(results_cache_dir))
+    else:
+        rows = [rows for rows, _ in evaluate_files(files_to_process, workers)]
+
+    # Save results to a CSV
+    print("Saving results to CSV...")
+    df = pd.DataFrame([row for row, _ in rows])
+    write_csv(df, os.path.join(vcf_directory, "metrics_results_snps_and_indels.csv"))
+    print("Metrics saved to metrics_results_snps_and_indels.csv")
+
+    region_rows = [region_row for _, file_region_rows in rows for region_row in file_region_rows]
+    region_df = pd.DataFrame([region_row for region_row in region_rows if "Shard" not in region_row])
+    if not region_df.empty:
+        write_csv(region_df, os.path.join(vcf_directory, "metrics_results_by_region.csv"))
+        print("Per-region metrics saved to metrics_results_by_region.csv")
+    shard_df = pd.DataFrame([region_row for region_row in region_rows if "Shard" in region_row])
+    if not shard_df.empty:
+        write_csv(shard_df, os.path.join(vcf_directory, "metrics_results_by_shard.csv"))
+        print("Per-shard metrics saved to metrics_results_by_shard.csv")
+
+    if telemetry_path:
+        telemetry.finish(os.path.splitext(telemetry_path)[0] + "_summary.csv")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+
+# Client of eval_service.py. It only needs the standard library, so a
+# pipeline can report its VCF without importing pandas or numpy.
+
+DEFAULT_PORT = 8765
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix socket."""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(method, path, body=None, socket_path=None, port=DEFAULT_PORT, timeout=None):
+    """Send one JSON request to the service and return its decoded reply, raising RuntimeError on errors."""
+    if socket_path:
+        connection = UnixHTTPConnection(socket_path, timeout)
+    else:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        data = json.dumps(body).encode() if body is not None else None
+        connection.request(method, path, data, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        reply = json.loads(response.read() or b"{}")
+    finally:
+        connection.close()
+    if response.status != 200:
+        raise RuntimeError(f"{response.status}: {reply.get('error', response.reason)}")
+    return reply
+
+
+def evaluate(vcf_path, file=None, socket_path=None, port=DEFAULT_PORT, timeout=None):
+    """Evaluate a pipeline VCF on the service and return its (row, region rows)."""
+    reply = request("POST", "/evaluate", {"vcf": os.path.abspath(vcf_path), "file": file}, socket_path, port, timeout)
+    return reply["row"], reply["region_rows"]
+
+
+def reload(truth_paths=None, socket_path=None, port=DEFAULT_PORT, timeout=None):
+    """Make the service re-read its truth sets, switching the variant types in truth_paths to new VCFs."""
+    truth_paths = {variant_type: os.path.abspath(path) for variant_type, path in (truth_paths or {}).items()}
+    return request("POST", "/reload", {"truth": truth_paths or None}, socket_path, port, timeout)["truth"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Submit requests to a running eval_service.py.")
+    parser.add_argument("--socket", help="Unix socket of the service (default: localhost)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="localhost port (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, help="seconds to wait for a reply (default: no limit)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    evaluate_parser = commands.add_parser("evaluate", help="evaluate a pipeline VCF and record its metrics")
+    evaluate_parser.add_argument("vcf", help="pipeline VCF")
+    evaluate_parser.add_argument("--file", help="name in the File column (default: the VCF file name)")
+    reload_parser = commands.add_parser("reload", help="reload the truth sets")
+    reload_parser.add_argument("--truth", action="append", metavar="TYPE=VCF", help="switch a variant type to this truth VCF")
+    commands.add_parser("status", help="show the loaded truth sets and pending requests")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "evaluate":
+            row, _ = evaluate(args.vcf, args.file, args.socket, args.port, args.timeout)
+            for column, value in row.items():
+                print(f"{column}\t{value}")
+        elif args.command == "reload":
+            truth_paths = dict(item.split("=", 1) for item in args.truth) if args.truth else None
+            print(json.dumps(reload(truth_paths, args.socket, args.port, args.timeout), indent=2))
+        else:
+            print(json.dumps(request("GET", "/status", socket_path=args.socket, port=args.port, timeout=args.timeout), indent=2))
+    except (OSError, RuntimeError) as e:
+        sys.exit(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
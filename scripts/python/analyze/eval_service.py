@@ -0,0 +1,264 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socketserver
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import calculate_metrics
+import telemetry
+from eval_client import DEFAULT_PORT
+
+# Resident evaluation service. The truth sets are parsed once into their
+# memory-mapped truth caches, which the service and its worker processes map
+# for their lifetime, so a pipeline that finishes only pays for reading its
+# own VCF. Requests arrive as JSON over HTTP on localhost or on a Unix socket
+# and run on a bounded process pool (key extraction holds the GIL, so threads
+# would evaluate one VCF at a time); every result is upserted into the
+# metrics tables next to the pipeline VCFs. See eval_client.py.
+#
+#   POST /evaluate {"vcf": path, "file": name}  -> {"row", "region_rows", "seconds"}
+#   POST /reload   {"truth": {type: path}}      -> {"truth": {type: {"path", "variants"}}}
+#   GET  /status                                -> truth sets, workers and pending requests
+
+
+class ServiceBusy(Exception):
+    """Raised when every worker slot and queue slot is taken."""
+
+
+class UnreadableVCF(Exception):
+    """Raised when a submitted VCF cannot be read or parsed."""
+
+
+def _source_state(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+@lru_cache(maxsize=8)
+def _truth_variants(path, state):
+    # Keyed by the truth VCF's (size, mtime) at the last reload, so workers map a rebuilt cache after a reload.
+    return calculate_metrics.restrict_to_targets(calculate_metrics.load_truth_variants(path))
+
+
+def _read_test_variants(vcf_path):
+    # Unlike calculate_metrics.load_variants, never turn a read error into an empty (all-FN) row.
+    try:
+        if calculate_metrics.variant_store_dir:
+            return calculate_metrics.load_store_variants(vcf_path)
+        return calculate_metrics.read_variants(vcf_path)
+    except Exception as e:
+        raise UnreadableVCF(f"Cannot read {vcf_path}: {e}") from e
+
+
+def evaluate_vcf(vcf_path, file, truth_sources):
+    """Worker job: return the (row, region rows) of a pipeline VCF against {variant type: (truth VCF, state)}."""
+    with telemetry.stage("service_evaluate", vcf_path):
+        test_variants = calculate_metrics.restrict_to_targets(_read_test_variants(vcf_path))
+        evaluations = {}
+        for variant_type, (path, state) in truth_sources.items():
+            truth_variants = _truth_variants(path, state)
+            counts = calculate_metrics.compare_variants(test_variants, truth_variants)
+            strata = {}
+            if calculate_metrics.stratification_regions:
+                strata = {
+                    stratum: calculate_metrics.metrics_from_counts(*stratum_counts)
+                    for stratum, stratum_counts in calculate_metrics.stratified_counts(test_variants, truth_variants).items()
+                }
+            evaluations[variant_type] = (calculate_metrics.metrics_from_counts(*counts), strata)
+        return calculate_metrics.make_rows(file, evaluations)
+
+
+class EvaluationService:
+    """Memory-mapped truth sets plus the process pool that evaluates pipeline VCFs against them."""
+
+    def __init__(self, output_dir, truth_paths=None, workers=None, max_pending=None):
+        if calculate_metrics.comparison_engine != "keys":
+            raise ValueError("The evaluation service needs comparison_engine = \"keys\"")
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count()
+        self.max_pending = max_pending or 4 * self.workers
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.reload_lock = threading.Lock()
+        self.table_lock = threading.Lock()
+        self.pending = 0
+        self.truth_paths = truth_paths or calculate_metrics.truth_sets()
+        self.truth = {}
+        self.reload()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork"))
+        # Fork every worker now, while this process has no server threads yet.
+        self.executor.submit(os.getpid).result()
+
+    def reload(self, truth_paths=None):
+        """Re-read the truth sets, switching the variant types given in truth_paths to new VCFs, and swap them in.
+
+        Truth VCFs that changed on disk are re-parsed through their caches.
+        Requests already running finish against the truth sets they started with.
+        """
+        with self.reload_lock:
+            truth_paths = {**self.truth_paths, **(truth_paths or {})}
+            truth = {}
+            for variant_type, path in truth_paths.items():
+                state = _source_state(path)
+                truth[variant_type] = (path, state, _truth_variants(path, state))
+            self.truth_paths, self.truth = truth_paths, truth
+        print(f"Loaded truth sets: {', '.join(f'{t}={len(keys)}' for t, (_, _, keys) in truth.items())}")
+        return self.status()["truth"]
+
+    def status(self):
+        truth = self.truth
+        return {
+            "truth": {variant_type: {"path": path, "variants": len(keys)} for variant_type, (path, _, keys) in truth.items()},
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+        }
+
+    def submit(self, vcf_path, file=None):
+        """Queue an evaluation on the worker pool, raising ServiceBusy when the queue is full."""
+        if not self.slots.acquire(blocking=False):
+            raise ServiceBusy(f"{self.max_pending} evaluations are already pending")
+        with self.table_lock:
+            self.pending += 1
+        truth_sources = {variant_type: (path, state) for variant_type, (path, state, _) in self.truth.items()}
+        future = self.executor.submit(evaluate_vcf, vcf_path, file or os.path.basename(vcf_path), truth_sources)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self.table_lock:
+            self.pending -= 1
+        self.slots.release()
+
+    def evaluate(self, vcf_path, file=None):
+        """Evaluate one pipeline VCF on the worker pool, record its rows in the metrics tables and return them."""
+        row, region_rows = self.submit(vcf_path, file).result()
+        self.record(row["File"], row, region_rows)
+        return row, region_rows
+
+    def record(self, file, row, region_rows):
+        """Replace the rows of a pipeline in the metrics tables (appending them if it is new)."""
+        with self.table_lock:
+            _upsert_rows(os.path.join(self.output_dir, "metrics_results_snps_and_indels.csv"), file, [row])
+            if region_rows:
+                _upsert_rows(os.path.join(self.output_dir, "metrics_results_by_region.csv"), file, region_rows)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def _upsert_rows(path, file, rows):
+    df = pd.DataFrame(rows)
+    if os.path.exists(path):
+        existing = pd.read_csv(path)
+        df = pd.concat([existing[existing["File"] != file], df], ignore_index=True)
+    calculate_metrics.write_csv(df, path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """JSON request handler; self.server.service is the EvaluationService."""
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._reply(200, self.server.service.status())
+        else:
+            self._reply(404, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/evaluate":
+                vcf_path = request.get("vcf")
+                if not vcf_path:
+                    return self._reply(400, {"error": "Missing \"vcf\""})
+                if not os.path.exists(vcf_path):
+                    return self._reply(404, {"error": f"No such file: {vcf_path}"})
+                start = time.perf_counter()
+                row, region_rows = service.evaluate(vcf_path, request.get("file"))
+                self._reply(200, {"row": row, "region_rows": region_rows, "seconds": time.perf_counter() - start})
+            elif self.path == "/reload":
+                self._reply(200, {"truth": service.reload(request.get("truth"))})
+            else:
+                self._reply(404, {"error": f"Unknown endpoint {self.path}"})
+        except ServiceBusy as e:
+            self._reply(503, {"error": str(e)})
+        except UnreadableVCF as e:
+            self._reply(422, {"error": str(e)})
+        except ValueError as e:
+            self._reply(400, {"error": str(e)})
+        except Exception as e:
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        print(f"{self.command} {self.path}: {format % args}")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP over a Unix socket, one thread per connection."""
+
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address.
+        return request, ("local", 0)
+
+
+def make_server(service, socket_path=None, port=DEFAULT_PORT):
+    """Return the HTTP server of a service, on a Unix socket if socket_path is set, otherwise on localhost:port."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, _Handler)
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve pipeline VCF evaluations against in-memory truth sets.")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of localhost")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="localhost port (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="worker processes, i.e. concurrent evaluations (default: all cores)")
+    parser.add_argument("--max-pending", type=int, help="running plus queued evaluations before requests are refused (default: 4 x workers)")
+    parser.add_argument("--output-dir", default=calculate_metrics.vcf_directory,
+                        help="where the metrics tables are updated (default: vcf_directory of calculate_metrics.py)")
+    parser.add_argument("--truth", action="append", metavar="TYPE=VCF",
+                        help="truth VCF of a variant type (default: the truth sets of calculate_metrics.py)")
+    args = parser.parse_args()
+
+    if calculate_metrics.telemetry_path:
+        telemetry.enable(calculate_metrics.telemetry_path, calculate_metrics.profile_stage, calculate_metrics.profile_mode)
+    truth_paths = dict(item.split("=", 1) for item in args.truth) if args.truth else None
+    service = EvaluationService(args.output_dir, truth_paths, args.workers, args.max_pending)
+    server = make_server(service, args.socket, args.port)
+    print(f"Evaluation service listening on {args.socket or f'http://127.0.0.1:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import pickle
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from truth_cache import atomic_write
+
+# Named figure definitions for the analysis scripts. A script describes every
+# figure as a FigureSpec (a plot function from this module, the data slice it
+# needs and its parameters). The same specs can be shown interactively one by
+# one, or rendered headless on the Agg backend across a process pool, skipping
+# figures whose data slice, parameters and plot code are unchanged.
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+MANIFEST_NAME = ".figures.json"
+
+FigureSpec = namedtuple("FigureSpec", ["name", "plot", "data", "params"])
+
+
+def _set_labels(title=None, xlabel=None, ylabel=None, legend_title=None):
+    import matplotlib.pyplot as plt
+    if title is not None:
+        plt.title(title)
+    if xlabel is not None:
+        plt.xlabel(xlabel)
+    if ylabel is not None:
+        plt.ylabel(ylabel)
+    if legend_title is not None:
+        plt.legend(title=legend_title)
+
+
+def plot_heatmap(data, title=None, xlabel=None, ylabel=None, **kwargs):
+    import seaborn as sns
+    sns.heatmap(data, **kwargs)
+    _set_labels(title, xlabel, ylabel)
+
+
+def plot_barplot(data, title=None, xlabel=None, ylabel=None, legend_title=None, **kwargs):
+    import seaborn as sns
+    sns.barplot(data=data, **kwargs)
+    _set_labels(title, xlabel, ylabel, legend_title)
+
+
+def plot_boxplot(data, title=None, xlabel=None, ylabel=None, **kwargs):
+    import seaborn as sns
+    sns.boxplot(data=data, **kwargs)
+    _set_labels(title, xlabel, ylabel)
+
+
+def plot_histplot(data, title=None, xlabel=None, ylabel=None, **kwargs):
+    import seaborn as sns
+    sns.histplot(data=data, **kwargs)
+    _set_labels(title, xlabel, ylabel)
+
+
+def plot_scatterplot(data, title=None, xlabel=None, ylabel=None, **kwargs):
+    import seaborn as sns
+    sns.scatterplot(data=data, **kwargs)
+    _set_labels(title, xlabel, ylabel)
+
+
+def plot_venn3(data, title=None, set_labels=None):
+    from matplotlib_venn import venn3
+    venn3(subsets=data, set_labels=set_labels)
+    _set_labels(title)
+
+
+def _data_digest(data):
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        digest = hashlib.sha256(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+        columns = data.columns if isinstance(data, pd.DataFrame) else [data.name]
+        digest.update(repr(list(columns)).encode())
+        return digest.hexdigest()
+    return hashlib.sha256(pickle.dumps(data)).hexdigest()
+
+
+def _code_digest(plot):
+    # Whole module sources, so edits to helpers such as _set_labels or _draw also re-render the figure.
+    modules = {inspect.getmodule(_draw), inspect.getmodule(plot)}
+    return sorted(hashlib.sha256(inspect.getsource(module).encode()).hexdigest() for module in modules)
+
+
+def figure_digest(spec):
+    """Return the content hash of a figure: its data slice, parameters and plot code."""
+    payload = {
+        "plot": inspect.getsource(spec.plot),
+        "code": _code_digest(spec.plot),
+        "params": json.dumps(spec.params, sort_keys=True, default=repr),
+        "data": _data_digest(spec.data),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _draw(spec):
+    import matplotlib.pyplot as plt
+    params = dict(spec.params)
+    plt.figure(figsize=params.pop("figsize", (10, 6)))
+    spec.plot(spec.data, **params)
+    plt.tight_layout()
+
+
+def _render_one(spec, path, dpi):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    _draw(spec)
+    plt.savefig(path, dpi=dpi)
+    plt.close("all")
+    return spec.name
+
+
+def show_figures(specs):
+    """Show every figure interactively, one window after another."""
+    import matplotlib.pyplot as plt
+    for spec in specs:
+        _draw(spec)
+        plt.show()
+
+
+def render_figures(specs, out_dir, workers=None, force=False, dpi=150):
+    """Render figures to <out_dir>/<name>.png on a process pool, skipping unchanged ones."""
+    import matplotlib
+    matplotlib.use("Agg")
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        manifest = {}
+
+    jobs = []
+    for spec in specs:
+        path = os.path.join(out_dir, f"{spec.name}.png")
+        digest = figure_digest(spec)
+        if not force and manifest.get(spec.name) == digest and os.path.exists(path):
+            continue
+        jobs.append((spec, path, digest))
+    print(f"Rendering {len(jobs)} of {len(specs)} figures to {out_dir}")
+
+    if jobs:
+        # Fork keeps the workers from re-running the calling script's top-level code.
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [(executor.submit(_render_one, spec, path, dpi), spec.name, digest) for spec, path, digest in jobs]
+            for future, name, digest in futures:
+                future.result()
+                manifest[name] = digest
+    atomic_write(manifest_path, lambda handle: handle.write(json.dumps(manifest, indent=2, sort_keys=True).encode()))
+    return [spec.name for spec, _, _ in jobs]
+
+
+def figure_arguments(description=None):
+    """Parse the common --render/--out-dir/--workers/--force options of the analysis scripts."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--render", action="store_true", help="write every figure as PNG instead of showing it")
+    parser.add_argument("--out-dir", help="output directory for --render")
+    parser.add_argument("--workers", type=int, help="worker processes for --render (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="re-render figures even if unchanged")
+    return parser.parse_args()
+
+
+def run_figures(specs, args, default_out_dir):
+    """Show the figures interactively, or render them headless if --render was given."""
+    if args.render:
+        render_figures(specs, args.out_dir or os.path.join(REPO_ROOT, default_out_dir), args.workers, args.force)
+    else:
+        show_figures(specs)
@@ -0,0 +1,149 @@
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from binary_matrix import load_binary_matrix
+
+# N-way intersection (UpSet) counts over a set x item membership matrix. Every
+# item gets a bitmask over the sets, and one np.unique over the masks counts
+# every non-empty combination at once instead of building 2^N set
+# intersections by hand.
+
+
+def membership_from_sets(named_sets):
+    """Build a sparse set x item membership matrix from a {name: iterable of items} mapping."""
+    names = list(named_sets)
+    all_items = [str(item) for name in names for item in named_sets[name]]
+    items, inverse = np.unique(np.array(all_items, dtype=str), return_inverse=True)
+    rows = np.repeat(np.arange(len(names)), [len(named_sets[name]) for name in names])
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, inverse)), shape=(len(names), len(items)))
+    matrix.data[:] = 1
+    return matrix, names, items
+
+
+def group_membership(matrix, names, groups):
+    """Combine set rows into groups ({group: [set names]}); an item is in a group if any member set has it."""
+    index = {name: i for i, name in enumerate(names)}
+    rows = [index[member] for members in groups.values() for member in members]
+    cols = [g for g, members in enumerate(groups.values()) for _ in members]
+    indicator = sparse.csr_matrix((np.ones(len(rows)), (cols, rows)), shape=(len(groups), len(names)))
+    combined = (indicator @ sparse.csr_matrix(matrix, dtype=np.float64)) > 0
+    return sparse.csr_matrix(combined, dtype=np.int8), list(groups)
+
+
+def item_masks(matrix):
+    """Return one bitmask per item as an (items x words) uint64 array (bit i = membership in set i)."""
+    matrix = sparse.csr_matrix(matrix)
+    matrix.eliminate_zeros()
+    n_sets, n_items = matrix.shape
+    masks = np.zeros((n_items, max(1, (n_sets + 63) // 64)), dtype=np.uint64)
+    for i in range(n_sets):
+        members = matrix.indices[matrix.indptr[i]:matrix.indptr[i + 1]]
+        masks[members, i // 64] |= np.uint64(1) << np.uint64(i % 64)
+    return masks
+
+
+def _mask_of(names, members):
+    index = {name: i for i, name in enumerate(names)}
+    mask = np.zeros(max(1, (len(names) + 63) // 64), dtype=np.uint64)
+    for member in members:
+        i = index[member]
+        mask[i // 64] |= np.uint64(1) << np.uint64(i % 64)
+    return mask
+
+
+def combination_table(matrix, names):
+    """Count the items of every non-empty exclusive combination of sets.
+
+    Returns a DataFrame with one boolean column per set, the number of sets
+    in the combination ("Degree") and the item count ("Count"), largest first.
+    """
+    masks = item_masks(matrix)
+    combos, counts = np.unique(masks, axis=0, return_counts=True)
+    keep = combos.any(axis=1)
+    combos, counts = combos[keep], counts[keep]
+    table = pd.DataFrame({
+        name: ((combos[:, i // 64] >> np.uint64(i % 64)) & np.uint64(1)).astype(bool)
+        for i, name in enumerate(names)
+    })
+    table["Degree"] = table[names].sum(axis=1)
+    table["Count"] = counts
+    return table.sort_values(["Count", "Degree"], ascending=[False, True], ignore_index=True)
+
+
+def combination_members(matrix, names, members, exclusive=True):
+    """Return the item indices that are in all given sets (and, if exclusive, in no other set)."""
+    masks = item_masks(matrix)
+    wanted = _mask_of(names, members)
+    if exclusive:
+        selected = (masks == wanted).all(axis=1)
+    else:
+        selected = ((masks & wanted) == wanted).all(axis=1)
+    return np.flatnonzero(selected)
+
+
+def venn3_subsets(table, names):
+    """Return the seven region sizes for matplotlib_venn.venn3 for three of the sets in a combination table."""
+    a, b, c = names
+    regions = {}
+    for pattern in ((1, 0, 0), (0, 1, 0), (1, 1, 0), (0, 0, 1), (1, 0, 1), (0, 1, 1), (1, 1, 1)):
+        selected = (table[a] == bool(pattern[0])) & (table[b] == bool(pattern[1])) & (table[c] == bool(pattern[2]))
+        regions[pattern] = int(table.loc[selected, "Count"].sum())
+    return tuple(regions.values())
+
+
+def plot_upset(table, names, max_combinations=30, title=None):
+    """Draw an UpSet-style plot (combination sizes over a membership dot matrix) and return the figure."""
+    # Imported here so the counting functions do not need matplotlib.
+    import matplotlib.pyplot as plt
+    shown = table.head(max_combinations)
+    x = np.arange(len(shown))
+    fig, (ax_bars, ax_dots) = plt.subplots(2, 1, figsize=(max(8, 0.4 * len(shown) + 4), 4 + 0.3 * len(names)),
+                                           sharex=True, gridspec_kw={"height_ratios": [3, max(1, 0.15 * len(names))]})
+    ax_bars.bar(x, shown["Count"], color="black")
+    ax_bars.set_ylabel("Intersection size")
+    if title:
+        ax_bars.set_title(title)
+
+    for row, name in enumerate(names):
+        present = shown[name].to_numpy()
+        ax_dots.scatter(x, np.full(len(x), row), c=np.where(present, "black", "lightgrey"), s=40)
+    for col, (_, combo) in enumerate(shown.iterrows()):
+        rows = [row for row, name in enumerate(names) if combo[name]]
+        if len(rows) > 1:
+            ax_dots.plot([col, col], [min(rows), max(rows)], color="black")
+    ax_dots.set_yticks(range(len(names)))
+    ax_dots.set_yticklabels(names)
+    ax_dots.set_xticks([])
+    fig.tight_layout()
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count N-way variant intersections between pipelines.")
+    parser.add_argument("matrix", nargs="?", default="binary_matrix.npz", help="binary matrix written by binary_matrix.py")
+    parser.add_argument("--table", default="variant_intersections.tsv", help="UpSet table output")
+    parser.add_argument("--plot", default="variant_intersections_upset.png", help="UpSet plot output")
+    parser.add_argument("--members", help="comma-separated pipelines; write the variants exclusive to this combination")
+    parser.add_argument("--members-output", default="combination_variants.tsv")
+    args = parser.parse_args()
+
+    variant_matrix = load_binary_matrix(args.matrix)
+    names = variant_matrix.pipelines
+    table = combination_table(variant_matrix.matrix, names)
+    table.to_csv(args.table, sep="\t", index=False)
+    print(f"{len(table)} non-empty combinations saved to {args.table}")
+
+    fig = plot_upset(table, names, title="Variant Intersections Across Pipelines")
+    fig.savefig(args.plot, dpi=300)
+    print(f"UpSet plot saved to {args.plot}")
+
+    if args.members:
+        members = args.members.split(",")
+        selected = combination_members(variant_matrix.matrix, names, members)
+        variant_matrix.variants.iloc[selected].drop(columns="key").to_csv(args.members_output, sep="\t", index=False)
+        print(f"{len(selected)} variants exclusive to {members} saved to {args.members_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import heapq
+import os
+import shutil
+import tempfile
+from itertools import groupby
+from vcf_scanner import iter_data_lines, read_header, split_core
+
+# Streaming TP/FP/FN comparison of two coordinate-sorted VCFs. Only the
+# records of the current position are held in memory; files that are not
+# sorted are first put in order with an external merge sort.
+
+MAX_RECORDS_IN_MEMORY = 1_000_000
+
+
+def contig_ranks(*vcf_paths):
+    """Return a contig -> rank mapping from the ##contig header lines of the given VCFs."""
+    ranks = {}
+    for path in vcf_paths:
+        for line in read_header(path):
+            if line.startswith("##contig=<"):
+                fields = dict(item.split("=", 1) for item in line[len("##contig=<"):-1].split(",") if "=" in item)
+                ranks.setdefault(fields["ID"], len(ranks))
+    return ranks
+
+
+def _parse(line, ranks):
+    """Turn a record line into (sort key, REF, ALT, line); unknown contigs sort after known ones."""
+    chrom, pos, ref, alt = split_core(line)
+    return (ranks.get(chrom, len(ranks)), chrom, pos), ref, alt, line
+
+
+def is_coordinate_sorted(vcf_path, ranks):
+    """Check whether the records of a VCF are sorted by contig rank and position."""
+    previous = None
+    for line in iter_data_lines(vcf_path):
+        chrom, pos = line.split(b"\t", 2)[:2]
+        chrom = chrom.decode()
+        current = (ranks.get(chrom, len(ranks)), chrom, int(pos))
+        if previous is not None and current < previous:
+            return False
+        previous = current
+    return True
+
+
+def _write_run(records, tmp_dir):
+    records.sort(key=lambda record: record[0])
+    fd, path = tempfile.mkstemp(dir=tmp_dir, suffix=".run")
+    with os.fdopen(fd, "wb") as handle:
+        for record in records:
+            handle.write(record[3] + b"\n")
+    return path
+
+
+def _read_run(path, ranks):
+    with open(path, "rb") as handle:
+        for line in handle:
+            yield _parse(line.rstrip(b"\n"), ranks)
+
+
+def _external_sort(vcf_path, ranks, tmp_dir, max_records):
+    """Yield the parsed records of a VCF in coordinate order using sorted runs on disk."""
+    run_paths = []
+    records = []
+    for line in iter_data_lines(vcf_path):
+        records.append(_parse(line, ranks))
+        if len(records) >= max_records:
+            run_paths.append(_write_run(records, tmp_dir))
+            records = []
+    if not run_paths:
+        records.sort(key=lambda record: record[0])
+        yield from records
+        return
+    if records:
+        run_paths.append(_write_run(records, tmp_dir))
+    del records
+    yield from heapq.merge(*(_read_run(path, ranks) for path in run_paths), key=lambda record: record[0])
+
+
+def iter_sorted_records(vcf_path, ranks, tmp_dir, max_records=MAX_RECORDS_IN_MEMORY, assume_sorted=False):
+    """Yield (sort key, REF, ALT, line) records of a VCF in coordinate order."""
+    if assume_sorted or is_coordinate_sorted(vcf_path, ranks):
+        for line in iter_data_lines(vcf_path):
+            yield _parse(line, ranks)
+    else:
+        print(f"{vcf_path} is not coordinate-sorted, sorting it externally")
+        yield from _external_sort(vcf_path, ranks, tmp_dir, max_records)
+
+
+def _iter_positions(records):
+    """Group sorted records by position into (sort key, {(REF, ALT): line})."""
+    for position, group in groupby(records, key=lambda record: record[0]):
+        alleles = {}
+        for _key, ref, alt, line in group:
+            alleles.setdefault((ref, alt), line)
+        yield position, alleles
+
+
+class _RecordWriter:
+    """Write TP/FP/FN records to <prefix>.tp.vcf, .fp.vcf and .fn.vcf."""
+
+    def __init__(self, output_prefix, test_vcf_path, truth_vcf_path):
+        test_header = "\n".join(read_header(test_vcf_path)) + "\n"
+        truth_header = "\n".join(read_header(truth_vcf_path)) + "\n"
+        self.handles = {}
+        for name, header in (("tp", test_header), ("fp", test_header), ("fn", truth_header)):
+            handle = open(f"{output_prefix}.{name}.vcf", "wb")
+            handle.write(header.encode())
+            self.handles[name] = handle
+
+    def write(self, name, lines):
+        handle = self.handles[name]
+        for line in lines:
+            handle.write(line + b"\n")
+
+    def close(self):
+        for handle in self.handles.values():
+            handle.close()
+
+
+def merge_compare(test_vcf_path, truth_vcf_path, output_prefix=None, max_records=MAX_RECORDS_IN_MEMORY, assume_sorted=False):
+    """Count TP, FP, FN with a merge join over two VCFs, optionally writing the records of each class."""
+    ranks = contig_ranks(truth_vcf_path, test_vcf_path)
+    tmp_dir = tempfile.mkdtemp(prefix="merge_compare_")
+    writer = _RecordWriter(output_prefix, test_vcf_path, truth_vcf_path) if output_prefix else None
+    tp = fp = fn = 0
+    try:
+        test_positions = _iter_positions(iter_sorted_records(test_vcf_path, ranks, tmp_dir, max_records, assume_sorted))
+        truth_positions = _iter_positions(iter_sorted_records(truth_vcf_path, ranks, tmp_dir, max_records, assume_sorted))
+        test_item = next(test_positions, None)
+        truth_item = next(truth_positions, None)
+        while test_item is not None or truth_item is not None:
+            if truth_item is None or (test_item is not None and test_item[0] < truth_item[0]):
+                fp += len(test_item[1])
+                if writer:
+                    writer.write("fp", test_item[1].values())
+                test_item = next(test_positions, None)
+            elif test_item is None or truth_item[0] < test_item[0]:
+                fn += len(truth_item[1])
+                if writer:
+                    writer.write("fn", truth_item[1].values())
+                truth_item = next(truth_positions, None)
+            else:
+                test_alleles, truth_alleles = test_item[1], truth_item[1]
+                shared = test_alleles.keys() & truth_alleles.keys()
+                tp += len(shared)
+                fp += len(test_alleles) - len(shared)
+                fn += len(truth_alleles) - len(shared)
+                if writer:
+                    writer.write("tp", (line for allele, line in test_alleles.items() if allele in shared))
+                    writer.write("fp", (line for allele, line in test_alleles.items() if allele not in shared))
+                    writer.write("fn", (line for allele, line in truth_alleles.items() if allele not in shared))
+                test_item = next(test_positions, None)
+                truth_item = next(truth_positions, None)
+    finally:
+        if writer:
+            writer.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return tp, fp, fn
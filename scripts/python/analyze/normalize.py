@@ -0,0 +1,151 @@
+import mmap
+import os
+import re
+import numpy as np
+from truth_cache import atomic_write
+from variant_keys import KEY_DTYPE
+from vcf_scanner import is_gzip, iter_data_lines, key_encoder
+
+# Variant normalization during key extraction, equivalent to
+# `bcftools norm -m -any -f ref.fa` without rewriting the VCF: multi-allelic
+# records are split into one key per ALT allele, alleles are trimmed and
+# indels are left-aligned against the reference. The reference FASTA is
+# memory-mapped and read through its .fai offsets, one cached block at a time.
+
+# Bump whenever normalize_allele() can return a different representation.
+NORMALIZATION_VERSION = 2
+BLOCK_SIZE = 1 << 16
+MAX_CACHED_BLOCKS = 256
+_SEQUENCE_ALLELE = re.compile(rb"[ACGTN]+")
+
+
+def build_fai(fasta_path, fai_path):
+    """Write the samtools-style .fai index (name, length, offset, line bases, line width) of a FASTA file."""
+    entries = []
+    name, length, offset, line_bases, line_width = None, 0, 0, 0, 0
+    position = 0
+    with open(fasta_path, "rb") as handle:
+        for line in handle:
+            if line[:1] == b">":
+                if name is not None:
+                    entries.append((name, length, offset, line_bases, line_width))
+                name = line[1:].split()[0].decode()
+                length, offset, line_bases, line_width = 0, position + len(line), 0, 0
+            elif name is not None and line.strip():
+                if line_bases == 0:
+                    line_bases, line_width = len(line.rstrip(b"\r\n")), len(line)
+                length += len(line.rstrip(b"\r\n"))
+            position += len(line)
+    if name is not None:
+        entries.append((name, length, offset, line_bases, line_width))
+    text = "".join("\t".join(map(str, entry)) + "\n" for entry in entries)
+    atomic_write(fai_path, lambda handle: handle.write(text.encode()))
+
+
+def reference_state(fasta_path):
+    """Return what identifies a normalization: the FASTA and .fai sizes and mtimes plus NORMALIZATION_VERSION."""
+    state = {"version": NORMALIZATION_VERSION}
+    for name, path in (("fasta", fasta_path), ("fai", fasta_path + ".fai")):
+        stat = os.stat(path)
+        state[f"{name}_size"], state[f"{name}_mtime_ns"] = stat.st_size, stat.st_mtime_ns
+    return state
+
+
+class ReferenceFasta:
+    """An indexed reference FASTA read through mmap, caching recently used blocks of the current contig."""
+
+    def __init__(self, fasta_path):
+        if is_gzip(fasta_path):
+            raise ValueError(f"{fasta_path} is compressed; normalization needs an uncompressed FASTA")
+        fai_path = fasta_path + ".fai"
+        if not os.path.exists(fai_path) or os.path.getmtime(fai_path) < os.path.getmtime(fasta_path):
+            print(f"Indexing {fasta_path}")
+            build_fai(fasta_path, fai_path)
+        self.index = {}
+        with open(fai_path) as handle:
+            for line in handle:
+                name, length, offset, line_bases, line_width = line.split("\t")[:5]
+                self.index[name] = (int(length), int(offset), int(line_bases), int(line_width))
+        with open(fasta_path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._contig = None
+        self._blocks = {}
+
+    def __contains__(self, contig):
+        return contig in self.index
+
+    def _block(self, contig, number):
+        if contig != self._contig or len(self._blocks) >= MAX_CACHED_BLOCKS:
+            self._contig, self._blocks = contig, {}
+        block = self._blocks.get(number)
+        if block is None:
+            length, offset, line_bases, line_width = self.index[contig]
+            start, end = number * BLOCK_SIZE, min((number + 1) * BLOCK_SIZE, length)
+            first = offset + start // line_bases * line_width + start % line_bases
+            last = offset + (end - 1) // line_bases * line_width + (end - 1) % line_bases + 1
+            block = self._blocks[number] = self._map[first:last].replace(b"\n", b"").replace(b"\r", b"").upper()
+        return block
+
+    def fetch(self, contig, start, end):
+        """Return the upper-case bases of the 0-based half-open [start, end) of a contig (clipped to its length)."""
+        end = min(end, self.index[contig][0])
+        if start >= end:
+            return b""
+        blocks = [self._block(contig, number) for number in range(start // BLOCK_SIZE, (end - 1) // BLOCK_SIZE + 1)]
+        offset = start // BLOCK_SIZE * BLOCK_SIZE
+        return b"".join(blocks)[start - offset:end - offset]
+
+
+def normalize_allele(reference, chrom, pos, ref, alt):
+    """Return the trimmed and left-aligned (POS, REF, ALT) of one REF/ALT pair (bytes alleles, 1-based POS).
+
+    Symbolic, missing and spanning-deletion alleles, and contigs missing from
+    the reference, are returned unchanged.
+    """
+    ref, alt = ref.upper(), alt.upper()
+    if len(ref) == 1 and len(alt) == 1:
+        return pos, ref, alt
+    if ref == alt or chrom not in reference or not _SEQUENCE_ALLELE.fullmatch(ref) or not _SEQUENCE_ALLELE.fullmatch(alt):
+        return pos, ref, alt
+    # Trim shared trailing bases, pulling in the preceding reference base whenever an allele runs empty.
+    while True:
+        if not ref or not alt:
+            if pos <= 1:
+                # Nothing precedes the contig start, so pad with the following base instead (as bcftools norm does).
+                base = reference.fetch(chrom, len(ref), len(ref) + 1)
+                ref, alt = ref + base, alt + base
+                break
+            pos -= 1
+            base = reference.fetch(chrom, pos - 1, pos)
+            ref, alt = base + ref, base + alt
+        elif ref[-1] == alt[-1]:
+            ref, alt = ref[:-1], alt[:-1]
+        else:
+            break
+    while len(ref) > 1 and len(alt) > 1 and ref[0] == alt[0]:
+        ref, alt, pos = ref[1:], alt[1:], pos + 1
+    return pos, ref, alt
+
+
+def normalizing_encoder(reference):
+    """Return a function that turns byte-string CHROM, POS, REF, ALT columns into one key per normalized ALT allele."""
+    encode = key_encoder()
+
+    def encode_all(chrom, pos, ref, alt):
+        if len(ref) == 1 and len(alt) == 1:
+            return [encode(chrom, pos, ref, alt)]
+        contig, pos = chrom.decode(), int(pos)
+        return [encode(chrom, *normalize_allele(reference, contig, pos, ref, allele)) for allele in alt.split(b",")]
+
+    return encode_all
+
+
+def scan_normalized_keys(path, reference, workers=None):
+    """Return the normalized keys of a VCF file as one uint64 array (unsorted, with duplicates)."""
+    encode_all = normalizing_encoder(reference)
+    keys = []
+    extend = keys.extend
+    for line in iter_data_lines(path, workers):
+        chrom, pos, _id, ref, alt = line.split(b"\t", 5)[:5]
+        extend(encode_all(chrom, pos, ref, alt))
+    return np.array(keys, dtype=KEY_DTYPE)
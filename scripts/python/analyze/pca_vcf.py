@@ -1,21 +1,30 @@
 import pandas as pd
 from sklearn.decomposition import PCA
 import matplotlib.pyplot as plt
+from binary_matrix import load_binary_matrix
+from sparse_pca import sparse_pca, top_loadings
 
-# Load the binary matrix
-binary_matrix = pd.read_csv('binary_matrix.tsv', sep='\t', index_col=0)
+# "sparse" runs a randomized truncated SVD on the sparse matrix with implicit
+# centering; "dense" builds the full variants x pipelines DataFrame for sklearn
+pca_mode = 'sparse'
 
-# Fill NaN values with 0
-binary_matrix = binary_matrix.fillna(0)
+# Load the sparse binary matrix written by binary_matrix.py (pipelines x variants)
+variant_matrix = load_binary_matrix('binary_matrix.npz')
+pipelines = variant_matrix.pipelines
+variants = variant_matrix.variant_labels()
 
 # Perform PCA
-pca = PCA(n_components=2)
-pca_result = pca.fit_transform(binary_matrix.T)  # Transpose to make pipelines as rows
-explained_variance = pca.explained_variance_ratio_
+if pca_mode == 'sparse':
+    pca_result, components, explained_variance = sparse_pca(variant_matrix.matrix, n_components=2)
+else:
+    binary_matrix = variant_matrix.to_frame()
+    pca = PCA(n_components=2)
+    pca_result = pca.fit_transform(binary_matrix.T)  # Transpose to make pipelines as rows
+    components, explained_variance = pca.components_, pca.explained_variance_ratio_
 
 # Extract PCA weights (loadings) for variants
-variant_weights = pd.DataFrame(pca.components_.T, 
-                                index=binary_matrix.index,  # Variants
+variant_weights = pd.DataFrame(components.T,
+                                index=pd.Index(variants, name='Variant'),
                                 columns=['PC1', 'PC2'])
 
 # Save variant weights to a file
@@ -23,7 +32,7 @@ variant_weights.to_csv('variant_pca_weights.tsv', sep='\t')
 
 # Plot PCA results for pipelines
 plt.figure(figsize=(10, 8))
-for i, pipeline in enumerate(binary_matrix.columns):
+for i, pipeline in enumerate(pipelines):
     plt.scatter(pca_result[i, 0], pca_result[i, 1], label=pipeline)
 
 plt.title('PCA of VCF Pipelines')
@@ -37,7 +46,7 @@ plt.show()
 
 # Plot PCA weights for variants in PC1
 plt.figure(figsize=(10, 6))
-variant_weights['PC1'].sort_values(ascending=False).head(20).plot(kind='bar', color='blue')
+top_loadings(variant_weights['PC1'], 20).plot(kind='bar', color='blue')
 plt.title('Top 20 Variant Contributions to PC1')
 plt.ylabel('Weight')
 plt.xlabel('Variants')
@@ -47,7 +56,7 @@ plt.show()
 
 # Plot PCA weights for variants in PC2
 plt.figure(figsize=(10, 6))
-variant_weights['PC2'].sort_values(ascending=False).head(20).plot(kind='bar', color='green')
+top_loadings(variant_weights['PC2'], 20).plot(kind='bar', color='green')
 plt.title('Top 20 Variant Contributions to PC2')
 plt.ylabel('Weight')
 plt.xlabel('Variants')
@@ -0,0 +1,70 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# Shared helpers for the analysis scripts: one declarative parser for the
+# pipeline configuration encoded in file names, and column-wise derived
+# metrics with safe division.
+
+# For each configuration column, the first pattern (case-insensitive) that
+# matches the file name gives its value. File names spell the recalibration
+# flag as "WithBase", "withBase", "with_Base", "Withbase", "noBase", "no_Base"...
+PIPELINE_FIELDS = {
+    "Mapper": [("bowtie", r"bowtie"), ("bwa", r"bwa")],
+    "Caller": [("mutect", r"mutect"), ("somaticsniper", r"somaticsniper"), ("strelka", r"strelka")],
+    "Recalibration": [("WithBase", r"with_?base"), ("NoBase", r"no_?base")],
+}
+UNKNOWN = "unknown"
+
+_COMPILED_FIELDS = {
+    field: [(value, re.compile(pattern, re.IGNORECASE)) for value, pattern in patterns]
+    for field, patterns in PIPELINE_FIELDS.items()
+}
+
+
+def parse_pipeline_config(name):
+    """Return the {Mapper, Caller, Recalibration} configuration encoded in a pipeline file name."""
+    name = os.path.basename(name)
+    return {
+        field: next((value for value, pattern in patterns if pattern.search(name)), UNKNOWN)
+        for field, patterns in _COMPILED_FIELDS.items()
+    }
+
+
+def add_pipeline_config(df, column="File", manifest=None):
+    """Add Mapper, Caller and Recalibration columns parsed once per distinct file name.
+
+    A manifest (CSV path or DataFrame with the same file column and any of the
+    configuration columns) overrides the values parsed from the names.
+    """
+    names = df[column].unique()
+    config = pd.DataFrame([parse_pipeline_config(name) for name in names], index=names)
+    if manifest is not None:
+        manifest = pd.read_csv(manifest) if isinstance(manifest, str) else manifest
+        config.update(manifest.set_index(column)[[field for field in PIPELINE_FIELDS if field in manifest]])
+    for field in PIPELINE_FIELDS:
+        df[field] = df[column].map(config[field])
+    return df
+
+
+def safe_divide(numerator, denominator):
+    """Element-wise numerator / denominator, with 0 where the denominator is 0."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros(np.broadcast(numerator, denominator).shape), where=denominator > 0)
+
+
+def add_derived_metrics(df, variant_types=("SNP", "Indel")):
+    """Add <type>_Precision, _Recall, _F1 and _Accuracy columns computed from <type>_TP/_FP/_FN."""
+    for variant_type in variant_types:
+        tp = df[f"{variant_type}_TP"].to_numpy(dtype=np.float64)
+        fp = df[f"{variant_type}_FP"].to_numpy(dtype=np.float64)
+        fn = df[f"{variant_type}_FN"].to_numpy(dtype=np.float64)
+        precision = safe_divide(tp, tp + fp)
+        recall = safe_divide(tp, tp + fn)
+        df[f"{variant_type}_Precision"] = precision
+        df[f"{variant_type}_Recall"] = recall
+        df[f"{variant_type}_F1"] = safe_divide(2 * precision * recall, precision + recall)
+        df[f"{variant_type}_Accuracy"] = safe_divide(tp, tp + fp + fn)
+    return df
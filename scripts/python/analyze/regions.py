@@ -0,0 +1,67 @@
+import numpy as np
+from variant_keys import contig_id, key_contigs, key_positions
+from vcf_scanner import iter_lines
+
+# BED region sets indexed per contig as sorted, merged interval arrays, so
+# that whole arrays of variant keys can be tested with one searchsorted per
+# contig instead of pre-filtering every VCF with an external tool.
+
+
+class RegionIndex:
+    """Sorted, non-overlapping intervals per contig, looked up by encoded variant keys."""
+
+    def __init__(self, intervals):
+        # {contig id: (starts, ends)} with 0-based, half-open, merged intervals
+        self.intervals = intervals
+
+    @classmethod
+    def from_bed(cls, *bed_paths):
+        """Build the index of the union of one or more (plain or gzipped) BED files."""
+        raw = {}
+        for bed_path in bed_paths:
+            for line in iter_lines(bed_path):
+                if not line.strip() or line.startswith((b"#", b"track", b"browser")):
+                    continue
+                chrom, start, end = line.split(b"\t", 3)[:3]
+                starts, ends = raw.setdefault(contig_id(chrom.decode()), ([], []))
+                starts.append(int(start))
+                ends.append(int(end))
+        return cls({cid: _merge(np.array(starts), np.array(ends)) for cid, (starts, ends) in raw.items()})
+
+    def __len__(self):
+        return sum(len(starts) for starts, _ in self.intervals.values())
+
+    def contains_keys(self, keys):
+        """Return a boolean mask of the variant keys whose position lies inside a region."""
+        keys = np.asarray(keys)
+        inside = np.zeros(len(keys), dtype=bool)
+        if len(keys) == 0:
+            return inside
+        contigs = key_contigs(keys)
+        positions = key_positions(keys) - 1  # BED is 0-based
+        # Group the keys by contig (already the case for sorted key arrays).
+        order = np.argsort(contigs, kind="stable")
+        group_ids, group_starts = np.unique(contigs[order], return_index=True)
+        group_ends = np.append(group_starts[1:], len(order))
+        for cid, lo, hi in zip(group_ids, group_starts, group_ends):
+            if cid not in self.intervals:
+                continue
+            selected = order[lo:hi]
+            starts, ends = self.intervals[cid]
+            pos = positions[selected]
+            idx = np.searchsorted(starts, pos, side="right") - 1
+            inside[selected] = (idx >= 0) & (pos < ends[np.maximum(idx, 0)])
+        return inside
+
+
+def _merge(starts, ends):
+    """Sort intervals and merge overlapping or adjacent ones."""
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    running_end = np.maximum.accumulate(ends)
+    new_block = np.ones(len(starts), dtype=bool)
+    new_block[1:] = starts[1:] > running_end[:-1]
+    block_ids = np.cumsum(new_block) - 1
+    merged_ends = np.zeros(block_ids[-1] + 1, dtype=np.int64)
+    np.maximum.at(merged_ends, block_ids, ends)
+    return starts[new_block], merged_ends
@@ -0,0 +1,131 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from truth_cache import atomic_write, file_sha256
+
+# Content-addressed store of calculate_metrics.py results. Each entry is keyed
+# by the SHA-256 of the pipeline VCF, the truth sets, the region files and the
+# matching parameters, so a re-run only evaluates inputs that changed.
+
+CACHE_VERSION = 1
+
+
+def _write_json(path, data):
+    atomic_write(path, lambda handle: handle.write(json.dumps(data, indent=2).encode()))
+
+
+def _read_json(path, default=None):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return default
+
+
+class ResultsCache:
+    """Directory of cached metric rows, one JSON file per input fingerprint."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.entry_dir = os.path.join(directory, "entries")
+        os.makedirs(self.entry_dir, exist_ok=True)
+        self.digest_path = os.path.join(directory, "digests.json")
+        self.last_run_path = os.path.join(directory, "last_run.json")
+        # Remember file digests by (size, mtime) so unchanged files are not re-hashed.
+        self.digests = _read_json(self.digest_path, {})
+        self.used_keys = set()
+
+    def file_digest(self, path):
+        """Return the SHA-256 of a file, reusing the stored digest while its size and mtime are unchanged."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self.digests.get(path)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+        digest = file_sha256(path)
+        self.digests[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        return digest
+
+    def entry_key(self, test_vcf_path, truth_vcf_paths, region_paths, params):
+        """Return the fingerprint of one evaluation: input contents plus matching parameters."""
+        fingerprint = {
+            "version": CACHE_VERSION,
+            "test": self.file_digest(test_vcf_path),
+            "truth": {name: self.file_digest(path) for name, path in truth_vcf_paths.items()},
+            "regions": {name: self.file_digest(path) for name, path in region_paths.items()},
+            "params": params,
+        }
+        return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.entry_dir, key + ".json")
+
+    def get(self, key):
+        """Return the cached value of an entry (marking it as used), or None."""
+        entry = _read_json(self._entry_path(key))
+        if entry is None:
+            return None
+        entry["last_used"] = time.time()
+        _write_json(self._entry_path(key), entry)
+        self.used_keys.add(key)
+        return entry["value"]
+
+    def put(self, key, value, label):
+        """Store the value of an entry."""
+        now = time.time()
+        _write_json(self._entry_path(key), {"key": key, "label": label, "created": now, "last_used": now, "value": value})
+        self.used_keys.add(key)
+
+    def save(self):
+        """Persist the digest memo and the set of entries used by this run."""
+        _write_json(self.digest_path, self.digests)
+        _write_json(self.last_run_path, {"time": time.time(), "keys": sorted(self.used_keys)})
+
+    def entries(self):
+        """Return the metadata of every cached entry, most recently used first."""
+        entries = []
+        for name in os.listdir(self.entry_dir):
+            entry = _read_json(os.path.join(self.entry_dir, name))
+            if entry is not None:
+                entries.append({field: entry[field] for field in ("key", "label", "created", "last_used")})
+        return sorted(entries, key=lambda entry: entry["last_used"], reverse=True)
+
+    def evict(self, older_than_days=None, not_in_last_run=False):
+        """Delete entries unused for a number of days and/or not used by the last run; return the evicted keys."""
+        last_run_keys = set(_read_json(self.last_run_path, {}).get("keys", []))
+        cutoff = time.time() - older_than_days * 86400 if older_than_days is not None else None
+        evicted = []
+        for entry in self.entries():
+            stale = (cutoff is not None and entry["last_used"] < cutoff) or (not_in_last_run and entry["key"] not in last_run_keys)
+            if stale:
+                os.unlink(self._entry_path(entry["key"]))
+                evicted.append(entry["key"])
+        return evicted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or evict cached calculate_metrics.py results.")
+    parser.add_argument("directory", help="results cache directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list cached entries")
+    evict = commands.add_parser("evict", help="delete stale entries")
+    evict.add_argument("--older-than", type=float, metavar="DAYS", help="entries not used for this many days")
+    evict.add_argument("--not-in-last-run", action="store_true", help="entries the last run did not use")
+    args = parser.parse_args()
+
+    cache = ResultsCache(args.directory)
+    if args.command == "list":
+        for entry in cache.entries():
+            last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"]))
+            print(f"{entry['key'][:16]}\t{last_used}\t{entry['label']}")
+    else:
+        if args.older_than is None and not args.not_in_last_run:
+            parser.error("evict needs --older-than and/or --not-in-last-run")
+        evicted = cache.evict(args.older_than, args.not_in_last_run)
+        print(f"Evicted {len(evicted)} entries")
+
+
+if __name__ == "__main__":
+    main()
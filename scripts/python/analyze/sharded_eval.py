@@ -0,0 +1,224 @@
+import argparse
+import os
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import calculate_metrics
+import telemetry
+from tabix import contig_lengths, ensure_indexed, fetch, load_index
+from variant_keys import KEY_DTYPE, to_key_array
+from normalize import normalizing_encoder
+from vcf_scanner import key_encoder
+
+# Contig-sharded evaluation. Test and truth VCFs are bgzipped and tabix
+# indexed (once), the genome is cut into whole-contig or fixed-size shards,
+# and every (pipeline, shard) job reads only the blocks of its shard and
+# counts TP/FP/FN against every truth set. A record belongs to the shard that
+# contains its POS, so the shards partition the variants and summing their
+# counts gives exactly the unsharded result. Per-shard metrics are kept
+# separately from the stratification strata, as rows with a Shard column.
+
+# Truth shards kept per worker process. Jobs are submitted shard by shard
+# across the pipelines, so a truth shard is reused while it is recent and a
+# worker never holds more than this many shards of the truth sets.
+TRUTH_SHARD_CACHE_SIZE = 8
+
+
+def parse_region(region):
+    """Parse "chr1", "chr1:1000" or "chr1:1,000-2,000" (1-based, inclusive) into (contig, start, end), 0-based half-open."""
+    contig, _, span = region.partition(":")
+    if not span:
+        return contig, 0, None
+    first, _, last = span.replace(",", "").partition("-")
+    return contig, int(first) - 1, int(last) if last else None
+
+
+def shard_label(contig, start, end):
+    """Return the 1-based, inclusive "contig:start-end" name of a shard."""
+    return f"{contig}:{start + 1}-{end}"
+
+
+def make_shards(indexed_paths, shard_size=None, regions=None):
+    """Cut the contigs of the indexed VCFs into (contig, start, end) shards.
+
+    shard_size None (or "contig") gives one shard per contig, an integer gives
+    fixed-size shards. Contig ends come from the ##contig header lines,
+    extended to the last indexed record of any VCF. With `regions`, only
+    those regions are sharded.
+    """
+    extents = {}
+    for bgzf_path, index_path in indexed_paths:
+        index = load_index(index_path)
+        lengths = contig_lengths(bgzf_path)
+        for contig in index.names:
+            extents[contig] = max(extents.get(contig, 0), lengths.get(contig, 0), index.extent(contig))
+    spans = [parse_region(region) for region in regions] if regions else [(contig, 0, None) for contig in extents]
+    step = None if shard_size in (None, "contig") else int(shard_size)
+    shards = []
+    for contig, start, end in spans:
+        if contig not in extents:
+            continue
+        end = end if end is not None else extents[contig]
+        for shard_start in range(start, end, step or max(end - start, 1)):
+            shards.append((contig, shard_start, min(shard_start + step, end) if step else end))
+    return shards
+
+
+def shard_keys(bgzf_path, index_path, contig, start, end):
+    """Return the sorted unique keys of the records whose POS lies in the 0-based [start, end) of a contig."""
+    if calculate_metrics.reference_fasta:
+        encode_all = normalizing_encoder(calculate_metrics.load_reference(calculate_metrics.reference_fasta))
+    else:
+        encode = key_encoder()
+
+        def encode_all(*columns):
+            return [encode(*columns)]
+    keys = []
+    for line in fetch(bgzf_path, load_index(index_path), contig, start, end):
+        chrom, pos, _id, ref, alt = line.split(b"\t", 5)[:5]
+        # Fetch also returns records overlapping the shard start; they belong to the previous shard.
+        if int(pos) > start:
+            keys.extend(encode_all(chrom, pos, ref, alt))
+    return to_key_array(np.array(keys, dtype=KEY_DTYPE))
+
+
+@lru_cache(maxsize=TRUTH_SHARD_CACHE_SIZE)
+def truth_shard_keys(bgzf_path, index_path, contig, start, end):
+    """Return the target-restricted keys of a truth shard, shared by the pipelines evaluated on this worker process."""
+    return calculate_metrics.restrict_to_targets(shard_keys(bgzf_path, index_path, contig, start, end))
+
+
+def evaluate_shard(test_indexed, truth_indexed, shard):
+    """Return {variant type: ((TP, FP, FN), {stratum: (TP, FP, FN)})} of one pipeline within one shard."""
+    with telemetry.stage("shard", test_indexed[0]) as stage:
+        test_keys = calculate_metrics.restrict_to_targets(shard_keys(*test_indexed, *shard))
+        counts = {}
+        for variant_type, truth_paths in truth_indexed.items():
+            truth_keys = truth_shard_keys(*truth_paths, *shard)
+            strata = calculate_metrics.stratified_counts(test_keys, truth_keys) if calculate_metrics.stratification_regions else {}
+            counts[variant_type] = (calculate_metrics.compare_variants(test_keys, truth_keys), strata)
+        stage.add(records=len(test_keys))
+    return counts
+
+
+def _add_counts(total, counts):
+    return tuple(a + b for a, b in zip(total, counts))
+
+
+def merge_shards(shard_counts):
+    """Sum per-shard counts into {variant type: (metrics, {stratum: metrics})}.
+
+    Also returns the metrics of every shard as {shard label: {variant type: metrics}}.
+    """
+    evaluations = {}
+    for variant_type in shard_counts[0][1]:
+        overall, strata = (0, 0, 0), {}
+        for _, counts in shard_counts:
+            shard_total, shard_strata = counts[variant_type]
+            overall = _add_counts(overall, shard_total)
+            for stratum, stratum_counts in shard_strata.items():
+                strata[stratum] = _add_counts(strata.get(stratum, (0, 0, 0)), stratum_counts)
+        evaluations[variant_type] = (
+            calculate_metrics.metrics_from_counts(*overall),
+            {name: calculate_metrics.metrics_from_counts(*stratum_counts) for name, stratum_counts in strata.items()},
+        )
+    shards = {
+        shard_label(*shard): {variant_type: calculate_metrics.metrics_from_counts(*total) for variant_type, (total, _) in counts.items()}
+        for shard, counts in shard_counts
+    }
+    return evaluations, shards
+
+
+def shard_rows(file, shards):
+    """Build one row per shard (File, Shard, metric columns) from merge_shards' per-shard metrics."""
+    return [calculate_metrics.make_row(file, metrics_by_type, label, "Shard") for label, metrics_by_type in shards.items()]
+
+
+def evaluate_sharded(vcf_paths, truth_paths, workers, shard_size=None, regions=None, index_dir=None):
+    """Evaluate every pipeline against every truth set, one (pipeline x shard) job per worker task.
+
+    Returns one (evaluations, shards) per pipeline: {variant type: (metrics, strata)}, as
+    calculate_metrics.evaluate gives, and {shard label: {variant type: metrics}}.
+    """
+    if calculate_metrics.comparison_engine != "keys":
+        raise ValueError("Sharded evaluation needs comparison_engine = \"keys\"")
+    if calculate_metrics.reference_fasta:
+        # Left-alignment can move a variant into the previous shard or out of a region, so shards must not split contigs.
+        partial_regions = [region for region in regions or [] if parse_region(region)[1:] != (0, None)]
+        if shard_size not in (None, "contig") or partial_regions:
+            raise ValueError("Normalization needs whole-contig shards (shard_size None or \"contig\", and regions naming whole contigs)")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        paths = list(dict.fromkeys(list(vcf_paths) + list(truth_paths.values())))
+        indexed = dict(zip(paths, executor.map(ensure_indexed, paths, [index_dir] * len(paths))))
+        truth_indexed = {variant_type: indexed[path] for variant_type, path in truth_paths.items()}
+        shards = {}
+        for vcf_path in vcf_paths:
+            shards[vcf_path] = make_shards([indexed[vcf_path]] + list(truth_indexed.values()), shard_size, regions)
+            print(f"Evaluating {vcf_path} in {len(shards[vcf_path])} shards")
+        # Shard by shard, so the truth shard cache of the workers keeps hitting.
+        order = sorted(((shard, vcf_path) for vcf_path in vcf_paths for shard in shards[vcf_path]), key=lambda job: job[0])
+        jobs = {(vcf_path, shard): executor.submit(evaluate_shard, indexed[vcf_path], truth_indexed, shard) for shard, vcf_path in order}
+        results = []
+        for vcf_path in vcf_paths:
+            shard_counts = [(shard, jobs[vcf_path, shard].result()) for shard in shards[vcf_path]]
+            if not shard_counts:
+                raise ValueError(f"No shards to evaluate for {vcf_path}")
+            results.append(merge_shards(shard_counts))
+    return results
+
+
+def evaluate_files(files, workers):
+    """Sharded counterpart of calculate_metrics.evaluate_files, driven by its settings.
+
+    Missing VCFs go through calculate_metrics.evaluate_file, which reports them as before.
+    """
+    present = [file for file in files if os.path.exists(os.path.join(calculate_metrics.vcf_directory, file))]
+    vcf_paths = [os.path.join(calculate_metrics.vcf_directory, file) for file in present]
+    results = evaluate_sharded(vcf_paths, calculate_metrics.truth_sets(), workers, calculate_metrics.shard_size,
+                               calculate_metrics.shard_regions, calculate_metrics.shard_index_dir) if present else []
+    rows = {}
+    for file, (evaluations, shards) in zip(present, results):
+        row, region_rows = calculate_metrics.make_rows(file, evaluations)
+        if calculate_metrics.shard_table:
+            region_rows += shard_rows(file, shards)
+        rows[file] = ((row, region_rows), True)
+    return [rows[file] if file in rows else calculate_metrics.evaluate_file(file) for file in files]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate pipeline VCFs in contig or fixed-size genome shards.")
+    parser.add_argument("vcfs", nargs="*", help="pipeline VCFs (default: files_to_process of calculate_metrics.py)")
+    parser.add_argument("--truth", action="append", metavar="TYPE=VCF",
+                        help="truth VCF of a variant type (default: the truth sets of calculate_metrics.py)")
+    parser.add_argument("--shard-size", type=int, help="shard length in bp (default: one shard per contig)")
+    parser.add_argument("--region", action="append", help="only evaluate this region (chr, chr:start-end; repeatable)")
+    parser.add_argument("--index-dir", help="where BGZF copies and indexes are written (default: next to each VCF)")
+    parser.add_argument("--reference", help="indexed reference FASTA; normalizes the variants before matching")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--out-prefix", default="sharded_metrics",
+                        help="write <prefix>.csv, <prefix>_by_shard.csv and, with strata, <prefix>_by_region.csv")
+    args = parser.parse_args()
+    if args.reference:
+        calculate_metrics.reference_fasta = args.reference
+
+    vcf_paths = args.vcfs or [os.path.join(calculate_metrics.vcf_directory, file) for file in calculate_metrics.files_to_process]
+    truth_paths = dict(item.split("=", 1) for item in args.truth) if args.truth else calculate_metrics.truth_sets()
+    results = evaluate_sharded(vcf_paths, truth_paths, args.workers or os.cpu_count(), args.shard_size, args.region, args.index_dir)
+    rows, region_rows, by_shard = [], [], []
+    for path, (evaluations, shards) in zip(vcf_paths, results):
+        row, file_region_rows = calculate_metrics.make_rows(os.path.basename(path), evaluations)
+        rows.append(row)
+        region_rows += file_region_rows
+        by_shard += shard_rows(os.path.basename(path), shards)
+
+    calculate_metrics.write_csv(pd.DataFrame(rows), f"{args.out_prefix}.csv")
+    calculate_metrics.write_csv(pd.DataFrame(by_shard), f"{args.out_prefix}_by_shard.csv")
+    print(f"Saved {args.out_prefix}.csv and {args.out_prefix}_by_shard.csv")
+    if region_rows:
+        calculate_metrics.write_csv(pd.DataFrame(region_rows), f"{args.out_prefix}_by_region.csv")
+        print(f"Saved {args.out_prefix}_by_region.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import numpy as np
+from scipy import sparse
+import telemetry
+
+# PCA of a sparse pipeline x variant matrix without ever densifying it. The
+# centering is applied implicitly inside every matrix product, so memory is
+# bounded by the non-zero entries plus a few dense blocks of n_pipelines or
+# (n_components + oversampling) columns.
+
+
+def _centered_dot(X, mean, B):
+    """Return (X - 1 mean) @ B for a dense B with one row per column of X."""
+    return X @ B - np.outer(np.ones(X.shape[0]), mean @ B)
+
+
+def _centered_tdot(X, mean, B):
+    """Return (X - 1 mean).T @ B for a dense B with one row per row of X."""
+    return X.T @ B - np.outer(mean, B.sum(axis=0))
+
+
+def sparse_pca(X, n_components=2, n_oversamples=10, n_iter=4, random_state=0):
+    """Randomized truncated SVD of the column-centered sparse matrix X.
+
+    Returns (scores, components, explained_variance_ratio) with the same
+    layout and sign convention as sklearn.decomposition.PCA.fit_transform,
+    .components_ and .explained_variance_ratio_.
+    """
+    X = sparse.csr_matrix(X, dtype=np.float64)
+    with telemetry.stage("pca") as stage:
+        stage.add(records=X.nnz)
+        n_samples, n_features = X.shape
+        mean = np.asarray(X.mean(axis=0)).ravel()
+        rank = min(n_components + n_oversamples, n_samples, n_features)
+        rng = np.random.default_rng(random_state)
+
+        # Range finder with power iterations; with few pipelines this spans the whole row space.
+        Q = _centered_dot(X, mean, rng.standard_normal((n_features, rank)))
+        Q, _ = np.linalg.qr(Q)
+        for _ in range(n_iter):
+            Q, _ = np.linalg.qr(_centered_dot(X, mean, _centered_tdot(X, mean, Q)))
+
+        # B = Q.T (X - 1 mean) is a small (rank x n_features) dense block.
+        B = _centered_tdot(X, mean, Q).T
+        U_small, singular_values, Vt = np.linalg.svd(B, full_matrices=False)
+        U = Q @ U_small
+
+        # Same deterministic signs as sklearn: the largest loading of each component is
+        # positive. Binary data produces many tied loadings, so ties are broken by index
+        # rather than by rounding noise; components can still differ from sklearn in sign.
+        largest = np.argmax(np.round(np.abs(Vt), 10), axis=1)
+        signs = np.sign(Vt[np.arange(len(Vt)), largest])
+        signs[signs == 0] = 1
+        U *= signs
+        Vt *= signs[:, None]
+
+        explained_variance = singular_values ** 2 / (n_samples - 1)
+        total_variance = (X.multiply(X).sum() - n_samples * mean @ mean) / (n_samples - 1)
+        scores = U[:, :n_components] * singular_values[:n_components]
+        return scores, Vt[:n_components], explained_variance[:n_components] / total_variance
+
+
+def top_loadings(weights, n=20):
+    """Return the n largest values of a Series, found with a partial selection instead of a full sort."""
+    values = weights.to_numpy()
+    if len(values) <= n:
+        return weights.sort_values(ascending=False)
+    top = np.argpartition(values, -n)[-n:]
+    return weights.iloc[top].sort_values(ascending=False)
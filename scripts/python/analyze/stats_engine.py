@@ -0,0 +1,254 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from binary_matrix import load_binary_matrix
+from intersections import item_masks
+from pipeline_metrics import PIPELINE_FIELDS, parse_pipeline_config
+from variant_keys import contains
+
+# Variant-level uncertainty for the pipeline comparison. Every variant in the
+# union of the pipeline calls and a truth set has an outcome pattern: which
+# pipelines called it, and whether it is in the truth set. Resampling only
+# needs the count of each distinct pattern, so thousands of bootstrap or
+# permutation replicates become a draw of pattern counts followed by a
+# (replicates x patterns) @ (patterns x pipelines) matrix product.
+
+METRICS = ["Precision", "Recall", "F1"]
+BATCH_SIZE = 1000
+
+# Default contrasts: (configuration field, first value, second value)
+CONTRASTS = [
+    ("Recalibration", "WithBase", "NoBase"),
+    ("Mapper", "bwa", "bowtie"),
+    ("Caller", "mutect", "strelka"),
+    ("Caller", "mutect", "somaticsniper"),
+    ("Caller", "strelka", "somaticsniper"),
+]
+
+
+class OutcomePatterns:
+    """Distinct (calls per pipeline, in truth) patterns of a variant set and how often each occurs."""
+
+    def __init__(self, called, in_truth, counts, pipelines):
+        self.called = np.asarray(called, dtype=bool)
+        self.in_truth = np.asarray(in_truth, dtype=bool)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.pipelines = list(pipelines)
+
+    @property
+    def n_variants(self):
+        return int(self.counts.sum())
+
+    def indicators(self):
+        """Return the (patterns x pipelines) TP, FP and FN indicator matrices."""
+        truth = self.in_truth[:, None]
+        return (
+            (self.called & truth).astype(np.float64),
+            (self.called & ~truth).astype(np.float64),
+            (~self.called & truth).astype(np.float64),
+        )
+
+
+def outcome_patterns(variant_matrix, truth_keys):
+    """Collapse the variants of a VariantMatrix plus a truth key array into outcome patterns.
+
+    Truth variants no pipeline called all share the "called by none, in truth"
+    pattern, so they are counted without being added to the matrix.
+    """
+    keys = variant_matrix.variants["key"].to_numpy(dtype=np.uint64)
+    in_truth = contains(truth_keys, keys)
+    masks = np.column_stack([item_masks(variant_matrix.matrix), in_truth.astype(np.uint64)])
+    combos, counts = np.unique(masks, axis=0, return_counts=True)
+    n_pipelines = len(variant_matrix.pipelines)
+    called = np.column_stack([
+        (combos[:, i // 64] >> np.uint64(i % 64)) & np.uint64(1) for i in range(n_pipelines)
+    ]).astype(bool)
+    truth = combos[:, -1].astype(bool)
+    missed = len(truth_keys) - int(in_truth.sum())
+    if missed:
+        called = np.vstack([called, np.zeros((1, n_pipelines), dtype=bool)])
+        truth = np.append(truth, True)
+        counts = np.append(counts, missed)
+    return OutcomePatterns(called, truth, counts, variant_matrix.pipelines)
+
+
+def metrics_from_count_arrays(tp, fp, fn):
+    """Vectorized precision, recall and F1 for arrays of TP/FP/FN counts (0 where undefined)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return {"Precision": precision, "Recall": recall, "F1": f1}
+
+
+def _bootstrap_batch(patterns, replicates, seed):
+    rng = np.random.default_rng(seed)
+    probabilities = patterns.counts / patterns.n_variants
+    weights = rng.multinomial(patterns.n_variants, probabilities, size=replicates).astype(np.float64)
+    tp, fp, fn = (weights @ indicator for indicator in patterns.indicators())
+    return metrics_from_count_arrays(tp, fp, fn)
+
+
+def _permutation_batch(counts, base, delta, averaging, replicates, seed):
+    rng = np.random.default_rng(seed)
+    swapped = rng.binomial(counts, 0.5, size=(replicates, len(counts))).astype(np.float64)
+    # Variants that swap labels move their outcome from one pipeline of a pair to the other.
+    shifted = {name: (base[name][0] + swapped @ delta[name], base[name][1] - swapped @ delta[name]) for name in base}
+    metrics_a = metrics_from_count_arrays(shifted["tp"][0], shifted["fp"][0], shifted["fn"][0])
+    metrics_b = metrics_from_count_arrays(shifted["tp"][1], shifted["fp"][1], shifted["fn"][1])
+    return {metric: (metrics_a[metric] - metrics_b[metric]) @ averaging for metric in METRICS}
+
+
+def _run_batches(function, args, replicates, random_state, workers):
+    """Run `replicates` draws of function(*args, batch, seed) in batches, optionally on a process pool."""
+    sizes = [BATCH_SIZE] * (replicates // BATCH_SIZE)
+    if replicates % BATCH_SIZE:
+        sizes.append(replicates % BATCH_SIZE)
+    # One child seed per batch keeps the result independent of the number of workers.
+    seeds = np.random.SeedSequence(random_state).spawn(len(sizes))
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(function, *zip(*[(*args, size, seed) for size, seed in zip(sizes, seeds)])))
+    else:
+        results = [function(*args, size, seed) for size, seed in zip(sizes, seeds)]
+    return {metric: np.concatenate([result[metric] for result in results]) for metric in METRICS}
+
+
+def bootstrap_metrics(patterns, replicates=10_000, confidence=0.95, random_state=0, workers=1):
+    """Bootstrap confidence intervals of precision, recall and F1 by resampling variants.
+
+    Returns one row per (pipeline, metric) with the point estimate and the
+    percentile interval.
+    """
+    tp, fp, fn = (patterns.counts @ indicator for indicator in patterns.indicators())
+    estimates = metrics_from_count_arrays(tp, fp, fn)
+    draws = _run_batches(_bootstrap_batch, (patterns,), replicates, random_state, workers)
+    tail = (1 - confidence) / 2 * 100
+    rows = []
+    for metric in METRICS:
+        low, high = np.percentile(draws[metric], [tail, 100 - tail], axis=0)
+        for i, pipeline in enumerate(patterns.pipelines):
+            rows.append({
+                "Pipeline": pipeline, "Metric": metric, "Estimate": estimates[metric][i],
+                "CI_Low": low[i], "CI_High": high[i],
+            })
+    return pd.DataFrame(rows)
+
+
+def contrast_pairs(pipelines, field, first, second):
+    """Pair the pipelines with field == first to those with field == second and the same other settings."""
+    configs = {pipeline: parse_pipeline_config(pipeline) for pipeline in pipelines}
+
+    def others(config):
+        return tuple(config[other] for other in PIPELINE_FIELDS if other != field)
+
+    seconds = {others(config): i for i, (pipeline, config) in enumerate(configs.items()) if config[field] == second}
+    return [
+        (i, seconds[others(config)])
+        for i, (pipeline, config) in enumerate(configs.items())
+        if config[field] == first and others(config) in seconds
+    ]
+
+
+def permutation_tests(patterns, pair_sets, replicates=10_000, random_state=0, workers=1):
+    """Paired permutation tests of the mean metric difference over sets of pipeline pairs.
+
+    Under the null hypothesis the two pipelines of a pair are exchangeable, so
+    each variant swaps its outcomes between them with probability 1/2, drawn
+    once per pattern and replicate and shared by every pair and pair set.
+    Patterns on which no pair disagrees cannot change any statistic and are
+    not resampled. Returns one {metric: (observed mean difference, two-sided
+    p-value)} per pair set.
+    """
+    first = [i for pairs in pair_sets for i, _ in pairs]
+    second = [j for pairs in pair_sets for _, j in pairs]
+    # Column averaging matrix: (all pairs x pair sets), 1/len(pairs) within each set.
+    averaging = np.zeros((len(first), len(pair_sets)))
+    column = 0
+    for k, pairs in enumerate(pair_sets):
+        averaging[column:column + len(pairs), k] = 1 / len(pairs)
+        column += len(pairs)
+
+    counts = patterns.counts.astype(np.float64)
+    differs = (patterns.called[:, first] != patterns.called[:, second]).any(axis=1)
+    base, delta = {}, {}
+    for name, indicator in zip(["tp", "fp", "fn"], patterns.indicators()):
+        a, b = indicator[:, first], indicator[:, second]
+        base[name] = (counts @ a, counts @ b)
+        delta[name] = (b - a)[differs]
+
+    observed_a = metrics_from_count_arrays(base["tp"][0], base["fp"][0], base["fn"][0])
+    observed_b = metrics_from_count_arrays(base["tp"][1], base["fp"][1], base["fn"][1])
+    observed = {metric: (observed_a[metric] - observed_b[metric]) @ averaging for metric in METRICS}
+    draws = _run_batches(_permutation_batch, (patterns.counts[differs], base, delta, averaging), replicates, random_state, workers)
+    results = []
+    for k in range(len(pair_sets)):
+        results.append({
+            metric: (
+                float(observed[metric][k]),
+                (1 + int((np.abs(draws[metric][:, k]) >= abs(observed[metric][k]) - 1e-12).sum())) / (replicates + 1),
+            )
+            for metric in METRICS
+        })
+    return results
+
+
+def contrast_tests(patterns, contrasts=CONTRASTS, replicates=10_000, random_state=0, workers=1):
+    """Run the paired permutation test of every (field, first, second) contrast with matching pipelines."""
+    tested = []
+    for field, first, second in contrasts:
+        pairs = contrast_pairs(patterns.pipelines, field, first, second)
+        if pairs:
+            tested.append((f"{field}: {first} vs {second}", pairs))
+        else:
+            print(f"No matching pipeline pairs for {field} {first} vs {second}")
+    if not tested:
+        return pd.DataFrame(columns=["Contrast", "Pairs", "Metric", "Mean_Difference", "P_Value"])
+    results = permutation_tests(patterns, [pairs for _, pairs in tested], replicates, random_state, workers)
+    return pd.DataFrame([
+        {"Contrast": label, "Pairs": len(pairs), "Metric": metric, "Mean_Difference": difference, "P_Value": p_value}
+        for (label, pairs), result in zip(tested, results)
+        for metric, (difference, p_value) in result.items()
+    ])
+
+
+def variant_level_statistics(variant_matrix, truth_keys_by_type, replicates=10_000, random_state=0, workers=1):
+    """Return (bootstrap intervals, contrast tests) of every variant type against its truth key array."""
+    intervals, tests = [], []
+    for variant_type, truth_keys in truth_keys_by_type.items():
+        patterns = outcome_patterns(variant_matrix, truth_keys)
+        print(f"{variant_type}: {patterns.n_variants} variants in {len(patterns.counts)} outcome patterns")
+        interval_table = bootstrap_metrics(patterns, replicates, random_state=random_state, workers=workers)
+        test_table = contrast_tests(patterns, replicates=replicates, random_state=random_state, workers=workers)
+        intervals.append(interval_table.assign(Variant_Type=variant_type))
+        tests.append(test_table.assign(Variant_Type=variant_type))
+    return pd.concat(intervals, ignore_index=True), pd.concat(tests, ignore_index=True)
+
+
+def main():
+    import calculate_metrics
+
+    parser = argparse.ArgumentParser(description="Variant-level bootstrap intervals and permutation tests for the pipelines.")
+    parser.add_argument("matrix", help="binary matrix .npz written by binary_matrix.py")
+    parser.add_argument("--truth", action="append", metavar="TYPE=VCF",
+                        help="truth VCF of a variant type (default: the truth sets of calculate_metrics.py)")
+    parser.add_argument("--replicates", type=int, default=10_000, help="bootstrap / permutation replicates")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (default: 1)")
+    parser.add_argument("--out-prefix", default="variant_level", help="write <prefix>_intervals.csv and <prefix>_tests.csv")
+    args = parser.parse_args()
+
+    truth_paths = dict(item.split("=", 1) for item in args.truth) if args.truth else calculate_metrics.truth_sets()
+    truth_keys = {variant_type: calculate_metrics.load_truth_variants(path) for variant_type, path in truth_paths.items()}
+    intervals, tests = variant_level_statistics(load_binary_matrix(args.matrix), truth_keys, args.replicates, args.seed, args.workers)
+    for table, suffix in ((intervals, "intervals"), (tests, "tests")):
+        path = f"{args.out_prefix}_{suffix}.csv"
+        calculate_metrics.write_csv(table, path)
+        print(f"Saved {os.path.abspath(path)}")
+    print(tests.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+import argparse
+import json
+import os
+import numpy as np
+from pipeline_metrics import parse_pipeline_config
+
+# Seeded generator of somatic tumor/normal VCFs in the column layouts of the
+# Mutect2, Strelka2 and SomaticSniper files in data/Passed_vcfs, for
+# benchmarking at sizes the real data does not reach. A shared variant
+# universe holds the truth set and a pool of recurrent artifacts, so the
+# pipelines overlap with the truth and with each other the way real callers do.
+
+# GRCh38 primary contigs and lengths (the contig lines of the real VCFs)
+CONTIGS = [
+    ("chr1", 248956422), ("chr2", 242193529), ("chr3", 198295559), ("chr4", 190214555), ("chr5", 181538259),
+    ("chr6", 170805979), ("chr7", 159345973), ("chr8", 145138636), ("chr9", 138394717), ("chr10", 133797422),
+    ("chr11", 135086622), ("chr12", 133275309), ("chr13", 114364328), ("chr14", 107043718), ("chr15", 101991189),
+    ("chr16", 90338345), ("chr17", 83257441), ("chr18", 80373285), ("chr19", 58617616), ("chr20", 64444167),
+    ("chr21", 46709983), ("chr22", 50818468), ("chrX", 156040895), ("chrY", 57227415), ("chrM", 16569),
+]
+BASES = "ACGT"
+INDEL_FRACTION = 0.1
+ARTIFACT_POOL_FACTOR = 2
+SHARED_ARTIFACT_FRACTION = 0.7
+
+# The 12 pipeline configurations of the real data; more pipelines repeat them with a replicate suffix.
+PIPELINE_CONFIGS = [
+    (mapper, caller, recalibration)
+    for mapper in ("bowtie", "bwa")
+    for caller in ("mutect", "somaticsniper", "strelka")
+    for recalibration in ("withBase", "no_Base")
+]
+
+MUTECT_HEADER = """##fileformat=VCFv4.2
+##FILTER=<ID=PASS,Description="All filters passed">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths for the ref and alt alleles in the order listed">
+##FORMAT=<ID=AF,Number=A,Type=Float,Description="Allele fractions of alternate alleles in the tumor">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Approximate read depth (reads with MQ=255 or with bad mates are filtered)">
+##FORMAT=<ID=F1R2,Number=R,Type=Integer,Description="Count of reads in F1R2 pair orientation supporting each allele">
+##FORMAT=<ID=F2R1,Number=R,Type=Integer,Description="Count of reads in F2R1 pair orientation supporting each allele">
+##FORMAT=<ID=FAD,Number=R,Type=Integer,Description="Count of fragments supporting each allele.">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=SB,Number=4,Type=Integer,Description="Per-sample component statistics which comprise the Fisher's Exact Test to detect strand bias.">
+##INFO=<ID=AS_FilterStatus,Number=A,Type=String,Description="Filter status for each allele, as assessed by ApplyVQSR. Note that the VCF filter field will reflect the most lenient/sensitive status across all alleles.">
+##INFO=<ID=AS_SB_TABLE,Number=1,Type=String,Description="Allele-specific forward/reverse read counts for strand bias tests. Includes the reference and alleles separated by |.">
+##INFO=<ID=DP,Number=1,Type=Integer,Description="Approximate read depth; some reads may have been filtered">
+##INFO=<ID=ECNT,Number=1,Type=Integer,Description="Number of events in this haplotype">
+##INFO=<ID=GERMQ,Number=1,Type=Integer,Description="Phred-scaled quality that alt alleles are not germline variants">
+##INFO=<ID=MBQ,Number=R,Type=Integer,Description="median base quality by allele">
+##INFO=<ID=MFRL,Number=R,Type=Integer,Description="median fragment length by allele">
+##INFO=<ID=MMQ,Number=R,Type=Integer,Description="median mapping quality by allele">
+##INFO=<ID=MPOS,Number=A,Type=Integer,Description="median distance from end of read">
+##INFO=<ID=NALOD,Number=A,Type=Float,Description="Negative log 10 odds of artifact in normal with same allele fraction as tumor">
+##INFO=<ID=NLOD,Number=A,Type=Float,Description="Normal log 10 likelihood ratio of diploid het or hom alt genotypes">
+##INFO=<ID=POPAF,Number=A,Type=Float,Description="negative log 10 population allele frequencies of alt alleles">
+##INFO=<ID=TLOD,Number=A,Type=Float,Description="Log 10 likelihood ratio score of variant existing versus not existing">
+##MutectVersion=2.2
+##normal_sample=normal
+##source=Mutect2
+##tumor_sample=tumor
+"""
+
+STRELKA_HEADER = """##fileformat=VCFv4.1
+##source=strelka
+##source_version=2.9.10
+##content=strelka somatic snv calls
+##INFO=<ID=QSS,Number=1,Type=Integer,Description="Quality score for any somatic snv, ie. for the ALT allele to be present at a significantly different frequency in the tumor and normal">
+##INFO=<ID=TQSS,Number=1,Type=Integer,Description="Data tier used to compute QSS">
+##INFO=<ID=NT,Number=1,Type=String,Description="Genotype of the normal in all data tiers, as used to classify somatic variants. One of {ref,het,hom,conflict}.">
+##INFO=<ID=QSS_NT,Number=1,Type=Integer,Description="Quality score reflecting the joint probability of a somatic variant and NT">
+##INFO=<ID=TQSS_NT,Number=1,Type=Integer,Description="Data tier used to compute QSS_NT">
+##INFO=<ID=SGT,Number=1,Type=String,Description="Most likely somatic genotype excluding normal noise states">
+##INFO=<ID=SOMATIC,Number=0,Type=Flag,Description="Somatic mutation">
+##INFO=<ID=DP,Number=1,Type=Integer,Description="Combined depth across samples">
+##INFO=<ID=MQ,Number=1,Type=Float,Description="RMS Mapping Quality">
+##INFO=<ID=MQ0,Number=1,Type=Integer,Description="Total Mapping Quality Zero Reads">
+##INFO=<ID=ReadPosRankSum,Number=1,Type=Float,Description="Z-score from Wilcoxon rank sum test of Alt Vs. Ref read-position in the tumor">
+##INFO=<ID=SNVSB,Number=1,Type=Float,Description="Somatic SNV site strand bias">
+##INFO=<ID=SomaticEVS,Number=1,Type=Float,Description="Somatic Empirical Variant Score (EVS) expressing the phred-scaled probability of the call being a false positive observation.">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth for tier1 (used+filtered)">
+##FORMAT=<ID=FDP,Number=1,Type=Integer,Description="Number of basecalls filtered from original read depth for tier1">
+##FORMAT=<ID=SDP,Number=1,Type=Integer,Description="Number of reads with deletions spanning this site at tier1">
+##FORMAT=<ID=SUBDP,Number=1,Type=Integer,Description="Number of reads below tier1 mapping quality threshold aligned across this site">
+##FORMAT=<ID=AU,Number=2,Type=Integer,Description="Number of 'A' alleles used in tiers 1,2">
+##FORMAT=<ID=CU,Number=2,Type=Integer,Description="Number of 'C' alleles used in tiers 1,2">
+##FORMAT=<ID=GU,Number=2,Type=Integer,Description="Number of 'G' alleles used in tiers 1,2">
+##FORMAT=<ID=TU,Number=2,Type=Integer,Description="Number of 'T' alleles used in tiers 1,2">
+##FILTER=<ID=PASS,Description="All filters passed">
+"""
+
+SOMATICSNIPER_HEADER = """##fileformat=VCFv4.2
+##source=SomaticSniper
+##FORMAT=<ID=AMQ,Number=.,Type=Integer,Description="Average mapping quality for each allele present in the genotype">
+##FORMAT=<ID=BCOUNT,Number=4,Type=Integer,Description="Occurrence count for each base at this site (A,C,G,T)">
+##FORMAT=<ID=BQ,Number=.,Type=Integer,Description="Average base quality">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Total read depth">
+##FORMAT=<ID=DP4,Number=4,Type=Integer,Description="# high-quality ref-forward bases, ref-reverse, alt-forward and alt-reverse bases">
+##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype quality">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=IGT,Number=1,Type=String,Description="Genotype when called independently (only filled if called in joint prior mode)">
+##FORMAT=<ID=JGQ,Number=1,Type=Integer,Description="Joint genotype quality (only filled if called in join prior mode)">
+##FORMAT=<ID=MQ,Number=1,Type=Integer,Description="Average mapping quality across all reads">
+##FORMAT=<ID=SS,Number=1,Type=Integer,Description="Variant status relative to non-adjacent Normal, 0=wildtype,1=germline,2=somatic,3=LOH,4=unknown">
+##FORMAT=<ID=SSC,Number=1,Type=Integer,Description="Somatic Score">
+##FORMAT=<ID=VAQ,Number=1,Type=Integer,Description="Variant allele quality">
+"""
+
+TRUTH_HEADER = """##fileformat=VCFv4.2
+##source=synthetic_vcfs.py
+"""
+
+
+def contig_lines():
+    return "".join(f"##contig=<ID={name},length={length}>\n" for name, length in CONTIGS)
+
+
+class VariantUniverse:
+    """Coordinate-sorted variants that pipelines and truth sets sample from.
+
+    Alleles are kept as small integer codes (REF base, ALT shift, indel
+    length) and only turned into strings for the records being written, so
+    a universe of tens of millions of variants stays a few hundred MB.
+    """
+
+    def __init__(self, contigs, positions, ref_bases, alt_shifts, indel_lengths, sequence_pool):
+        self.contigs = contigs
+        self.positions = positions
+        self.ref_bases = ref_bases
+        self.alt_shifts = alt_shifts
+        # 0 for SNVs, +n for an n-base insertion, -n for an n-base deletion
+        self.indel_lengths = indel_lengths
+        self.sequence_pool = sequence_pool
+        self.is_snv = indel_lengths == 0
+
+    def __len__(self):
+        return len(self.positions)
+
+    def alleles(self, indices):
+        """Return the REF and ALT strings of the variants at the given indices."""
+        refs, alts = [], []
+        pool, pool_size = self.sequence_pool, len(self.sequence_pool) - 16
+        for i, base, shift, length in zip(indices.tolist(), self.ref_bases[indices].tolist(), self.alt_shifts[indices].tolist(),
+                                          self.indel_lengths[indices].tolist()):
+            ref = BASES[base]
+            if length == 0:
+                refs.append(ref)
+                alts.append(BASES[(base + shift) % 4])
+                continue
+            start = i % pool_size
+            extra = pool[start:start + abs(length)]
+            if length > 0:
+                refs.append(ref)
+                alts.append(ref + extra)
+            else:
+                refs.append(ref + extra)
+                alts.append(ref)
+        return refs, alts
+
+
+def make_universe(size, rng):
+    """Draw `size` distinct variants spread over the contigs by length, ~10% of them indels."""
+    lengths = np.array([length for _, length in CONTIGS], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    # Unique genome-wide coordinates (the genome is far larger than any universe, so few draws collide).
+    coordinates = np.unique(rng.integers(0, offsets[-1], size=int(size * 1.01) + 16))
+    while len(coordinates) < size:
+        coordinates = np.unique(np.concatenate([coordinates, rng.integers(0, offsets[-1], size=size)]))
+    coordinates = np.sort(rng.choice(coordinates, size=size, replace=False))
+    contigs = (np.searchsorted(offsets, coordinates, side="right") - 1).astype(np.int8)
+    positions = (coordinates - offsets[contigs] + 1).astype(np.int32)
+    del coordinates
+
+    ref_bases = rng.integers(0, 4, size, dtype=np.int8)
+    alt_shifts = rng.integers(1, 4, size, dtype=np.int8)
+    indel_lengths = np.zeros(size, dtype=np.int8)
+    indels = rng.random(size) < INDEL_FRACTION
+    indel_lengths[indels] = rng.integers(1, 11, int(indels.sum()), dtype=np.int8) * rng.choice(np.array([-1, 1], dtype=np.int8), int(indels.sum()))
+    sequence_pool = "".join(BASES[i] for i in rng.integers(0, 4, 1 << 16))
+    return VariantUniverse(contigs, positions, ref_bases, alt_shifts, indel_lengths, sequence_pool)
+
+
+def pipeline_file_names(n_pipelines):
+    """Return file names that parse into the 12 real configurations (repeated with _rep<i> beyond 12)."""
+    names = []
+    for i in range(n_pipelines):
+        mapper, caller, recalibration = PIPELINE_CONFIGS[i % len(PIPELINE_CONFIGS)]
+        replicate = f"_rep{i // len(PIPELINE_CONFIGS)}" if n_pipelines > len(PIPELINE_CONFIGS) else ""
+        names.append(f"final_{mapper}_{caller}_{recalibration}{replicate}.vcf")
+    return names
+
+
+def _mutect_columns(count, rng):
+    normal_depth = rng.integers(20, 120, count)
+    tumor_depth = rng.integers(10, 120, count)
+    tumor_alt = np.maximum(1, (tumor_depth * rng.uniform(0.03, 0.6, count)).astype(np.int64)).tolist()
+    tlod = np.round(rng.gamma(2.0, 15.0, count) + 3, 2).tolist()
+    nlod = (normal_depth * 0.18).tolist()
+    normal_depth, tumor_depth = normal_depth.tolist(), tumor_depth.tolist()
+    info = [
+        f"AS_FilterStatus=SITE;AS_SB_TABLE={nd // 2},{nd - nd // 2}|{ta // 2},{ta - ta // 2};DP={nd + td};ECNT=1;GERMQ={g};"
+        f"MBQ=20,20;MFRL={fr},{fa};MMQ=60,60;MPOS={mp};NALOD={nalod:.2f};NLOD={nlod:.2f};POPAF=6;TLOD={t}"
+        for nd, td, ta, g, fr, fa, mp, nalod, nlod, t in zip(
+            normal_depth, tumor_depth, tumor_alt, rng.integers(1, 94, count).tolist(), rng.integers(140, 180, count).tolist(),
+            rng.integers(140, 240, count).tolist(), rng.integers(5, 40, count).tolist(), rng.uniform(0.5, 2.5, count).tolist(),
+            nlod, tlod)
+    ]
+    samples = [
+        f"0/0:{nd},0:{1 / (nd + 2):.3f}:{nd}:{nd // 3},0:{nd // 3},0:{nd // 2},0:{nd // 2},{nd - nd // 2},0,0\t"
+        f"0/1:{td - ta},{ta}:{ta / td:.3f}:{td}:{(td - ta) // 3},{ta // 3}:{(td - ta) // 3},{ta // 3}:{(td - ta) // 2},{ta // 2}:"
+        f"{(td - ta) // 2},{td - ta - (td - ta) // 2},{ta // 2},{ta - ta // 2}"
+        for nd, td, ta in zip(normal_depth, tumor_depth, tumor_alt)
+    ]
+    return ["."] * count, ["PASS"] * count, info, "GT:AD:AF:DP:F1R2:F2R1:FAD:SB", samples
+
+
+def _strelka_columns(count, rng, refs, alts):
+    normal_depth = rng.integers(15, 100, count)
+    tumor_depth = rng.integers(5, 100, count)
+    tumor_alt = np.maximum(1, (tumor_depth * rng.uniform(0.05, 0.6, count)).astype(np.int64)).tolist()
+    qss = rng.integers(5, 250, count).tolist()
+    evs = np.round(rng.gamma(2.0, 6.0, count) + 1, 2).tolist()
+    normal_depth, tumor_depth = normal_depth.tolist(), tumor_depth.tolist()
+    info = [
+        f"SOMATIC;QSS={q};TQSS=1;NT=ref;QSS_NT={q};TQSS_NT=1;SGT={r}{r}->{r}{a};DP={nd + td};MQ=60;MQ0=0;"
+        f"ReadPosRankSum={rp:.2f};SNVSB=0;SomaticEVS={e}"
+        for q, r, a, nd, td, rp, e in zip(qss, refs, alts, normal_depth, tumor_depth, rng.normal(0, 1, count).tolist(), evs)
+    ]
+
+    def counts(ref, alt, depth, alt_depth):
+        values = {base: 0 for base in "ACGT"}
+        values[ref] = depth - alt_depth
+        values[alt] += alt_depth
+        return ":".join(f"{values[base]},{values[base]}" for base in "ACGT")
+
+    samples = [
+        f"{nd}:0:0:0:{counts(r, a, nd, 0)}\t{td}:0:0:0:{counts(r, a, td, ta)}"
+        for r, a, nd, td, ta in zip(refs, alts, normal_depth, tumor_depth, tumor_alt)
+    ]
+    return ["."] * count, ["PASS"] * count, info, "DP:FDP:SDP:SUBDP:AU:CU:GU:TU", samples
+
+
+def _somaticsniper_columns(count, rng, refs, alts):
+    normal_depth = rng.integers(5, 80, count)
+    tumor_depth = rng.integers(5, 80, count)
+    tumor_alt = np.maximum(1, (tumor_depth * rng.uniform(0.1, 0.7, count)).astype(np.int64)).tolist()
+    ssc = rng.integers(15, 120, count).tolist()
+    normal_depth, tumor_depth = normal_depth.tolist(), tumor_depth.tolist()
+    index = {base: i for i, base in enumerate("ACGT")}
+
+    def bcount(ref, alt, depth, alt_depth):
+        values = [0, 0, 0, 0]
+        values[index[ref]] = depth - alt_depth
+        values[index[alt]] += alt_depth
+        return ",".join(map(str, values))
+
+    samples = [
+        f"0/0:0/0:{nd}:{nd // 2},{nd - nd // 2},0,0:{bcount(r, a, nd, 0)}:{gq}:.:0:33:60:60:0:.\t"
+        f"0/1:0/1:{td}:{(td - ta) // 2},{td - ta - (td - ta) // 2},{ta // 2},{ta - ta // 2}:{bcount(r, a, td, ta)}:{gq}:.:{s}:33,31:60:60,60:2:{s}"
+        for r, a, nd, td, ta, gq, s in zip(refs, alts, normal_depth, tumor_depth, tumor_alt, rng.integers(20, 90, count).tolist(), ssc)
+    ]
+    return ["."] * count, ["."] * count, ["."] * count, "GT:IGT:DP:DP4:BCOUNT:GQ:JGQ:VAQ:BQ:MQ:AMQ:SS:SSC", samples
+
+
+def write_vcf(path, universe, indices, caller, rng, chunk_size=200_000):
+    """Write the universe variants at the given (sorted) indices in one caller's layout."""
+    header, samples = {
+        "mutect": (MUTECT_HEADER, "normal\ttumor"),
+        "strelka": (STRELKA_HEADER, "NORMAL\tTUMOR"),
+        "somaticsniper": (SOMATICSNIPER_HEADER, "NORMAL\tTUMOR"),
+    }[caller]
+    names = np.array([name for name, _ in CONTIGS])
+    with open(path, "w") as handle:
+        handle.write(header + contig_lines())
+        handle.write(f"#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{samples}\n")
+        for start in range(0, len(indices), chunk_size):
+            chunk = indices[start:start + chunk_size]
+            refs, alts = universe.alleles(chunk)
+            if caller == "mutect":
+                quals, filters, info, format_keys, sample_columns = _mutect_columns(len(chunk), rng)
+            elif caller == "strelka":
+                quals, filters, info, format_keys, sample_columns = _strelka_columns(len(chunk), rng, refs, alts)
+            else:
+                quals, filters, info, format_keys, sample_columns = _somaticsniper_columns(len(chunk), rng, refs, alts)
+            handle.writelines(
+                f"{c}\t{p}\t.\t{r}\t{a}\t{q}\t{f}\t{i}\t{format_keys}\t{s}\n"
+                for c, p, r, a, q, f, i, s in zip(
+                    names[universe.contigs[chunk]].tolist(), universe.positions[chunk].tolist(), refs, alts, quals, filters, info, sample_columns)
+            )
+
+
+def write_truth_vcf(path, universe, indices, chunk_size=200_000):
+    """Write a sites-only truth VCF of the universe variants at the given (sorted) indices."""
+    names = np.array([name for name, _ in CONTIGS])
+    with open(path, "w") as handle:
+        handle.write(TRUTH_HEADER + contig_lines())
+        handle.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for start in range(0, len(indices), chunk_size):
+            chunk = indices[start:start + chunk_size]
+            refs, alts = universe.alleles(chunk)
+            handle.writelines(
+                f"{c}\t{p}\t.\t{r}\t{a}\t.\tPASS\t.\n"
+                for c, p, r, a in zip(names[universe.contigs[chunk]].tolist(), universe.positions[chunk].tolist(), refs, alts)
+            )
+
+
+def generate_dataset(directory, n_records=10_000, n_pipelines=12, seed=0):
+    """Write n_pipelines somatic VCFs of ~n_records calls each plus truth_snps.vcf/truth_indels.vcf.
+
+    Returns the manifest ({"pipelines": [paths], "records": [counts], "truth": {type: path}});
+    an existing dataset with the same parameters is reused, since generation
+    is deterministic in (n_records, n_pipelines, seed).
+    """
+    directory = os.path.abspath(directory)
+    manifest_path = os.path.join(directory, "manifest.json")
+    parameters = {"n_records": n_records, "n_pipelines": n_pipelines, "seed": seed}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+        if manifest["parameters"] == parameters and all(os.path.exists(path) for path in manifest["pipelines"]):
+            return manifest
+    os.makedirs(directory, exist_ok=True)
+    print(f"Generating {n_pipelines} synthetic VCFs with ~{n_records} records each in {directory}")
+
+    rng = np.random.default_rng(seed)
+    n_truth = n_records
+    n_artifacts = ARTIFACT_POOL_FACTOR * n_records
+    universe = make_universe(n_truth + n_artifacts + n_records * min(n_pipelines, 100) // 10, rng)
+    # Truth, shared artifacts and private false positives are disjoint slices of a shuffled index.
+    order = rng.permutation(len(universe))
+    truth = np.sort(order[:n_truth])
+    artifacts = order[n_truth:n_truth + n_artifacts]
+    private = order[n_truth + n_artifacts:]
+
+    truth_paths = {"SNP": os.path.join(directory, "truth_snps.vcf"), "Indel": os.path.join(directory, "truth_indels.vcf")}
+    write_truth_vcf(truth_paths["SNP"], universe, truth[universe.is_snv[truth]])
+    write_truth_vcf(truth_paths["Indel"], universe, truth[~universe.is_snv[truth]])
+
+    pipelines, records = [], []
+    for name in pipeline_file_names(n_pipelines):
+        caller = parse_pipeline_config(name)["Caller"]
+        recall = rng.uniform(0.5, 0.9)
+        n_tp = int(recall * n_truth)
+        n_fp = n_records - n_tp
+        n_shared = int(n_fp * SHARED_ARTIFACT_FRACTION)
+        calls = np.concatenate([
+            rng.choice(truth, n_tp, replace=False),
+            rng.choice(artifacts, n_shared, replace=False),
+            rng.choice(private, min(n_fp - n_shared, len(private)), replace=False),
+        ])
+        calls = np.sort(calls)
+        if caller != "mutect":
+            calls = calls[universe.is_snv[calls]]
+        path = os.path.join(directory, name)
+        write_vcf(path, universe, calls, caller, rng)
+        pipelines.append(path)
+        records.append(len(calls))
+
+    manifest = {"parameters": parameters, "pipelines": pipelines, "records": records, "truth": truth_paths}
+    with open(manifest_path, "w") as handle:
+        json.dump(manifest, handle, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic Mutect2/Strelka2/SomaticSniper VCFs and truth sets.")
+    parser.add_argument("directory", help="output directory")
+    parser.add_argument("--records", type=int, default=10_000, help="records per pipeline VCF (default: %(default)s)")
+    parser.add_argument("--pipelines", type=int, default=12, help="number of pipeline VCFs (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    args = parser.parse_args()
+    manifest = generate_dataset(args.directory, args.records, args.pipelines, args.seed)
+    print(f"Wrote {len(manifest['pipelines'])} pipeline VCFs and the truth sets to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
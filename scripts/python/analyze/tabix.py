@@ -0,0 +1,330 @@
+import itertools
+import os
+import re
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from truth_cache import atomic_write
+from vcf_scanner import _bgzf_block_size, is_bgzf, iter_chunks, read_header
+
+# BGZF compression and tabix indexing of VCFs, enough for region queries
+# without htslib. The .tbi files follow the tabix format (VCF preset: binning
+# index plus 16 kb linear index), so they are interchangeable with the ones
+# written by `tabix -p vcf`.
+
+BGZF_BLOCK_SIZE = 0xFF00
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+LINEAR_SHIFT = 14
+PSEUDO_BIN = 37450
+_BGZF_BLOCK_HEADER = struct.Struct("<4BI2BH2sHH")
+_TBI_HEADER = struct.Struct("<8i")
+_CONTIG_LINE = re.compile(r"##contig=<.*?ID=([^,>]+).*?length=(\d+)")
+
+
+def compress_block(data):
+    """Return one BGZF block holding `data` (at most BGZF_BLOCK_SIZE bytes)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    header = _BGZF_BLOCK_HEADER.pack(0x1F, 0x8B, 8, 4, 0, 0, 0xFF, 6, b"BC", 2, len(compressed) + 25)
+    return header + compressed + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+def bgzf_compress(data):
+    """Compress bytes into a complete BGZF stream (blocks plus the EOF marker)."""
+    blocks = [compress_block(data[i:i + BGZF_BLOCK_SIZE]) for i in range(0, len(data), BGZF_BLOCK_SIZE)]
+    return b"".join(blocks) + BGZF_EOF
+
+
+def bgzip(path, out_path, workers=None):
+    """Recompress a plain or gzip file as BGZF, deflating blocks on a thread pool."""
+    def write(handle):
+        pending = b""
+        with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as executor:
+            for chunk in iter_chunks(path):
+                pending += chunk
+                usable = len(pending) - len(pending) % BGZF_BLOCK_SIZE
+                blocks = [pending[i:i + BGZF_BLOCK_SIZE] for i in range(0, usable, BGZF_BLOCK_SIZE)]
+                handle.writelines(executor.map(compress_block, blocks))
+                pending = pending[usable:]
+        if pending:
+            handle.write(compress_block(pending))
+        handle.write(BGZF_EOF)
+    atomic_write(out_path, write)
+
+
+def iter_blocks(handle, offset=0):
+    """Yield (compressed offset, decompressed payload) of the BGZF blocks from a file offset on."""
+    handle.seek(offset)
+    while True:
+        header = handle.read(_BGZF_BLOCK_HEADER.size)
+        if not header:
+            return
+        size = _bgzf_block_size(header, 0)
+        if size is None:
+            raise ValueError(f"Truncated BGZF block at offset {offset}")
+        block = header + handle.read(size - len(header))
+        xlen = struct.unpack_from("<H", block, 10)[0]
+        yield offset, zlib.decompress(block[12 + xlen:-8], -15)
+        offset += size
+
+
+def reg2bin(beg, end):
+    """Return the smallest tabix bin containing the 0-based half-open interval [beg, end)."""
+    end -= 1
+    if beg >> 14 == end >> 14:
+        return ((1 << 15) - 1) // 7 + (beg >> 14)
+    if beg >> 17 == end >> 17:
+        return ((1 << 12) - 1) // 7 + (beg >> 17)
+    if beg >> 20 == end >> 20:
+        return ((1 << 9) - 1) // 7 + (beg >> 20)
+    if beg >> 23 == end >> 23:
+        return ((1 << 6) - 1) // 7 + (beg >> 23)
+    if beg >> 26 == end >> 26:
+        return ((1 << 3) - 1) // 7 + (beg >> 26)
+    return 0
+
+
+def reg2bins(beg, end):
+    """Return every tabix bin that may hold records overlapping [beg, end)."""
+    end -= 1
+    bins = [0]
+    for offset, shift in ((1, 26), (9, 23), (73, 20), (585, 17), (4681, 14)):
+        bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+    return bins
+
+
+class _ReferenceIndex:
+    """Binning and linear index of one contig while it is being built."""
+
+    def __init__(self):
+        self.bins = {}
+        self.linear = []
+        self.first = None
+        self.last = None
+        self.records = 0
+
+    def add(self, beg, end, start_offset, end_offset):
+        chunks = self.bins.setdefault(reg2bin(beg, end), [])
+        if chunks and chunks[-1][1] == start_offset:
+            chunks[-1][1] = end_offset
+        else:
+            chunks.append([start_offset, end_offset])
+        last_window = (end - 1) >> LINEAR_SHIFT
+        if last_window >= len(self.linear):
+            self.linear.extend([None] * (last_window + 1 - len(self.linear)))
+        for window in range(beg >> LINEAR_SHIFT, last_window + 1):
+            if self.linear[window] is None:
+                self.linear[window] = start_offset
+        if self.first is None:
+            self.first = start_offset
+        self.last = end_offset
+        self.records += 1
+
+    def serialize(self):
+        # Empty windows take the offset of the window before them (the contig start for leading ones).
+        linear, previous = [], self.first
+        for offset in self.linear:
+            previous = previous if offset is None else offset
+            linear.append(previous)
+        parts = [struct.pack("<i", len(self.bins) + 1)]
+        for bin_number, chunks in self.bins.items():
+            parts.append(struct.pack("<Ii", bin_number, len(chunks)))
+            parts.extend(struct.pack("<QQ", *chunk) for chunk in chunks)
+        parts.append(struct.pack("<IiQQQQ", PSEUDO_BIN, 2, self.first, self.last, self.records, 0))
+        parts.append(struct.pack(f"<i{len(linear)}Q", len(linear), *linear))
+        return b"".join(parts)
+
+
+def build_index(bgzf_path, index_path):
+    """Write the tabix index of a coordinate-sorted BGZF VCF."""
+    references = {}
+    current_name, current, last_beg = None, None, -1
+
+    def index_line(line, start_offset, end_offset):
+        nonlocal current_name, current, last_beg
+        if not line or line[:1] == b"#":
+            return
+        chrom, pos, _id, ref = line.split(b"\t", 4)[:4]
+        name = chrom.decode()
+        beg = int(pos) - 1
+        if name != current_name:
+            if name in references:
+                raise ValueError(f"{bgzf_path} is not sorted: {name} appears in more than one block of records")
+            current_name, current, last_beg = name, references.setdefault(name, _ReferenceIndex()), -1
+        if beg < last_beg:
+            raise ValueError(f"{bgzf_path} is not sorted: {name}:{beg + 1} follows {name}:{last_beg + 1}")
+        last_beg = beg
+        current.add(beg, beg + max(len(ref.rstrip(b"\r")), 1), start_offset, end_offset)
+
+    # Virtual offsets are (block offset << 16) | offset within the decompressed block.
+    pending, pending_start, end_offset = b"", 0, 0
+    with open(bgzf_path, "rb") as handle:
+        for block_offset, payload in iter_blocks(handle):
+            start = 0
+            while True:
+                newline = payload.find(b"\n", start)
+                if newline < 0:
+                    if start < len(payload):
+                        if not pending:
+                            pending_start = (block_offset << 16) | start
+                        pending += payload[start:]
+                        end_offset = (block_offset << 16) | len(payload)
+                    break
+                line_offset = pending_start if pending else (block_offset << 16) | start
+                line = pending + payload[start:newline]
+                pending = b""
+                start = newline + 1
+                index_line(line, line_offset, (block_offset << 16) | start)
+    index_line(pending, pending_start, end_offset)
+
+    names = b"".join(name.encode() + b"\0" for name in references)
+    parts = [b"TBI\1", _TBI_HEADER.pack(len(references), 2, 1, 2, 0, ord("#"), 0, len(names)), names]
+    parts.extend(reference.serialize() for reference in references.values())
+    parts.append(struct.pack("<Q", 0))
+    atomic_write(index_path, lambda handle: handle.write(bgzf_compress(b"".join(parts))))
+
+
+class TabixIndex:
+    """A parsed .tbi file: per contig, the chunks of every bin and the linear index."""
+
+    def __init__(self, names, bins, linear, records):
+        self.names = names
+        self.bins = bins
+        self.linear = linear
+        self.records = records
+
+    def extent(self, contig):
+        """Return an upper bound of the record end positions on a contig (0 if it has no records)."""
+        return len(self.linear.get(contig, ())) << LINEAR_SHIFT
+
+    def chunks(self, contig, start, end):
+        """Return the merged, sorted (begin, end) virtual-offset ranges that may hold records overlapping [start, end)."""
+        if contig not in self.bins:
+            return []
+        linear = self.linear[contig]
+        min_offset = linear[min(start >> LINEAR_SHIFT, len(linear) - 1)] if linear else 0
+        bins = self.bins[contig]
+        candidates = sorted(chunk for bin_number in reg2bins(start, end) for chunk in bins.get(bin_number, ()) if chunk[1] > min_offset)
+        merged = []
+        for chunk_start, chunk_end in candidates:
+            if merged and chunk_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], chunk_end)
+            else:
+                merged.append([max(chunk_start, min_offset), chunk_end])
+        return merged
+
+
+def read_index(index_path):
+    """Parse a tabix (.tbi) index."""
+    data = b"".join(iter_chunks(index_path))
+    if data[:4] != b"TBI\1":
+        raise ValueError(f"{index_path} is not a tabix index")
+    n_ref, _format, _seq, _beg, _end, _meta, _skip, names_length = _TBI_HEADER.unpack_from(data, 4)
+    offset = 4 + _TBI_HEADER.size
+    names = [name.decode() for name in data[offset:offset + names_length].split(b"\0")[:n_ref]]
+    offset += names_length
+    bins, linear, records = {}, {}, {}
+    for name in names:
+        n_bin, = struct.unpack_from("<i", data, offset)
+        offset += 4
+        contig_bins = {}
+        for _ in range(n_bin):
+            bin_number, n_chunk = struct.unpack_from("<Ii", data, offset)
+            offset += 8
+            chunks = [list(chunk) for chunk in struct.iter_unpack("<QQ", data[offset:offset + 16 * n_chunk])]
+            offset += 16 * n_chunk
+            if bin_number == PSEUDO_BIN:
+                records[name] = chunks[1][0]
+            else:
+                contig_bins[bin_number] = chunks
+        n_intv, = struct.unpack_from("<i", data, offset)
+        offset += 4
+        linear[name] = list(struct.unpack_from(f"<{n_intv}Q", data, offset))
+        offset += 8 * n_intv
+        bins[name] = contig_bins
+    return TabixIndex(names, bins, linear, records)
+
+
+@lru_cache(maxsize=None)
+def _cached_index(index_path, mtime):
+    return read_index(index_path)
+
+
+def load_index(index_path):
+    """Parse a tabix index once per process (re-reading it if the file changed)."""
+    return _cached_index(index_path, os.path.getmtime(index_path))
+
+
+def _is_stale(derived_path, source_path):
+    return not os.path.exists(derived_path) or os.path.getmtime(derived_path) < os.path.getmtime(source_path)
+
+
+def ensure_indexed(vcf_path, index_dir=None):
+    """Return the (BGZF VCF, tabix index) paths of a VCF, compressing and indexing it first if needed.
+
+    Plain and gzip VCFs get a BGZF copy, and indexes that do not exist yet
+    are written, in index_dir (default: next to the VCF). Existing
+    up-to-date copies and indexes, including ones from bgzip/tabix, are reused.
+    """
+    directory = index_dir or os.path.dirname(os.path.abspath(vcf_path))
+    os.makedirs(directory, exist_ok=True)
+    if is_bgzf(vcf_path):
+        bgzf_path = vcf_path
+    else:
+        name = os.path.basename(vcf_path)
+        bgzf_path = os.path.join(directory, name[:-3] + ".bgz" if name.endswith(".gz") else name + ".gz")
+        if _is_stale(bgzf_path, vcf_path):
+            print(f"Compressing {vcf_path} to {bgzf_path}")
+            bgzip(vcf_path, bgzf_path)
+    for index_path in (bgzf_path + ".tbi", os.path.join(directory, os.path.basename(bgzf_path) + ".tbi")):
+        if not _is_stale(index_path, bgzf_path):
+            return bgzf_path, index_path
+    print(f"Indexing {bgzf_path}")
+    build_index(bgzf_path, index_path)
+    return bgzf_path, index_path
+
+
+def contig_lengths(bgzf_path):
+    """Return the {contig: length} declared by the ##contig header lines of a VCF."""
+    lengths = {}
+    for line in read_header(bgzf_path):
+        match = _CONTIG_LINE.match(line)
+        if match:
+            lengths[match.group(1)] = int(match.group(2))
+    return lengths
+
+
+def _iter_range(handle, begin, end):
+    """Yield the decompressed bytes between two virtual offsets."""
+    end_block, end_within = end >> 16, end & 0xFFFF
+    within = begin & 0xFFFF
+    for block_offset, payload in iter_blocks(handle, begin >> 16):
+        if block_offset >= end_block:
+            yield payload[within:end_within]
+            return
+        yield payload[within:]
+        within = 0
+
+
+def fetch(bgzf_path, index, contig, start=0, end=None):
+    """Yield the record lines (bytes) of a contig overlapping the 0-based half-open [start, end)."""
+    end = end if end is not None else index.extent(contig)
+    name = contig.encode()
+    with open(bgzf_path, "rb") as handle:
+        for chunk_start, chunk_end in index.chunks(contig, start, end):
+            tail = b""
+            # The trailing newline flushes a last record that has none.
+            for data in itertools.chain(_iter_range(handle, chunk_start, chunk_end), [b"\n"]):
+                lines = (tail + data).split(b"\n")
+                tail = lines.pop()
+                for line in lines:
+                    if not line or line[:1] == b"#":
+                        continue
+                    chrom, pos, _id, ref = line.split(b"\t", 4)[:4]
+                    beg = int(pos) - 1
+                    # Records are sorted, so nothing after this one can overlap the region.
+                    if beg >= end:
+                        return
+                    if beg + max(len(ref), 1) > start and chrom == name:
+                        yield line.rstrip(b"\r")
@@ -0,0 +1,339 @@
+import argparse
+import collections
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+# Stage-level telemetry for the evaluation scripts. Code wraps its stages in
+#
+#     with telemetry.stage("load_variants", file=path) as stage:
+#         ...
+#         stage.add(records=len(variants))
+#
+# and, while telemetry is enabled, every stage appends one JSON line with its
+# wall and CPU time, records, bytes read and peak RSS. When it is disabled
+# (the default) stage() returns a shared no-op object, so the instrumentation
+# can stay in production runs. Worker processes forked while telemetry is on
+# append to the same file under the same run id.
+
+PROFILE_MODES = ["cprofile", "sample"]
+SAMPLE_INTERVAL = 0.005
+
+_telemetry = None
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak-RSS counter of this process (Linux); return False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as handle:
+            handle.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bytes_read():
+    """Return the bytes this process has read through system calls so far (Linux), or None."""
+    try:
+        with open("/proc/self/io") as handle:
+            for line in handle:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class _NullStage:
+    """Stage handle used while telemetry is disabled; every operation is a no-op."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add(self, records=0, bytes_read=0):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Stage:
+    """One timed stage; use as a context manager and report its work with add()."""
+
+    def __init__(self, telemetry, name, file):
+        self.telemetry = telemetry
+        self.name = name
+        self.file = file
+        self.records = 0
+        self.bytes = None
+        self.peak_rss = 0.0
+        self.profiler = None
+
+    def add(self, records=0, bytes_read=0):
+        """Count records processed (and bytes read, if not measured from /proc) by this stage."""
+        self.records += records
+        if bytes_read:
+            self.bytes = (self.bytes or 0) + bytes_read
+
+    def __enter__(self):
+        stack = self.telemetry.stack
+        # Fold the parent's peak so far into it before resetting the counter for this stage.
+        if stack:
+            stack[-1].peak_rss = max(stack[-1].peak_rss, peak_rss_mb())
+        self.rss_scope = "stage" if reset_peak_rss() else "process"
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        if self.name == self.telemetry.profile_stage:
+            self.profiler = self.telemetry.start_profiler()
+        self.rchar = bytes_read()
+        self.start_time = time.time()
+        self.wall_start, self.cpu_start = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        wall, cpu = time.perf_counter() - self.wall_start, time.process_time() - self.cpu_start
+        if self.profiler is not None:
+            self.telemetry.stop_profiler(self.profiler, self)
+        rchar = bytes_read()
+        self.peak_rss = max(self.peak_rss, peak_rss_mb())
+        stack = self.telemetry.stack
+        stack.pop()
+        if stack:
+            stack[-1].peak_rss = max(stack[-1].peak_rss, self.peak_rss)
+        measured = rchar - self.rchar if rchar is not None and self.rchar is not None else None
+        self.telemetry.write({
+            "run": self.telemetry.run_id, "pid": os.getpid(), "stage": self.name, "file": self.file,
+            "parent": self.parent, "start": self.start_time, "wall_s": wall, "cpu_s": cpu,
+            "records": self.records, "records_per_s": self.records / wall if wall > 0 else None,
+            "bytes_read": self.bytes if self.bytes is not None else measured,
+            "peak_rss_mb": self.peak_rss, "rss_scope": self.rss_scope, "ok": exc_type is None,
+        })
+        return False
+
+
+class _Sampler:
+    """Sampling profiler: a thread that records the stack of the profiled thread every interval."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def write(self, path):
+        """Write the samples in the folded-stack format read by flamegraph.pl and speedscope."""
+        with open(path, "w") as handle:
+            for stack, count in self.stacks.most_common():
+                handle.write(f"{stack} {count}\n")
+
+
+class Telemetry:
+    """Destination and settings of an enabled telemetry session."""
+
+    def __init__(self, path, profile_stage=None, profile_mode="cprofile", profile_dir=None):
+        if profile_mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {profile_mode!r}, expected one of {PROFILE_MODES}")
+        self.path = os.path.abspath(path)
+        self.profile_stage = profile_stage
+        self.profile_mode = profile_mode
+        self.profile_dir = os.path.abspath(profile_dir or os.path.dirname(self.path))
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.stack = []
+        self.profile_count = 0
+
+    def write(self, event):
+        # One write() on an O_APPEND descriptor per line keeps lines from forked workers whole.
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(event) + "\n").encode())
+        finally:
+            os.close(fd)
+
+    def start_profiler(self):
+        if self.profile_mode == "sample":
+            return _Sampler(threading.get_ident()).start()
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop_profiler(self, profiler, stage):
+        self.profile_count += 1
+        suffix = f"-{os.path.basename(stage.file)}" if stage.file else ""
+        base = os.path.join(self.profile_dir, f"{stage.name}{suffix}-{os.getpid()}-{self.profile_count}")
+        os.makedirs(self.profile_dir, exist_ok=True)
+        if self.profile_mode == "sample":
+            profiler.stop()
+            profiler.write(base + ".folded")
+            print(f"Sampled stacks of {stage.name} saved to {base}.folded")
+        else:
+            profiler.disable()
+            profiler.dump_stats(base + ".prof")
+            print(f"Profile of {stage.name} saved to {base}.prof")
+
+
+def stage(name, file=None):
+    """Return a context manager timing one stage, or a no-op one while telemetry is disabled."""
+    if _telemetry is None:
+        return _NULL_STAGE
+    return Stage(_telemetry, name, file)
+
+
+def enabled():
+    """Return whether telemetry is being collected."""
+    return _telemetry is not None
+
+
+def enable(path, profile_stage=None, profile_mode="cprofile", profile_dir=None):
+    """Start appending stage events to a JSON-lines file, optionally profiling every run of one stage."""
+    global _telemetry
+    _telemetry = Telemetry(path, profile_stage, profile_mode, profile_dir)
+    return _telemetry
+
+
+def disable():
+    """Stop collecting; return the run id of the finished session (None if none was active)."""
+    global _telemetry
+    session, _telemetry = _telemetry, None
+    return session.run_id if session else None
+
+
+def read_events(path, run_id=None):
+    """Return the events of a telemetry file, optionally only those of one run."""
+    with open(path) as handle:
+        events = [json.loads(line) for line in handle if line.strip()]
+    return [event for event in events if run_id is None or event["run"] == run_id]
+
+
+def summarize(events, by_file=False):
+    """Aggregate events per stage (and file): calls, total wall/CPU time, records, bytes and peak RSS."""
+    groups = {}
+    for event in events:
+        key = (event["stage"], event["file"] if by_file else None)
+        group = groups.setdefault(key, {"stage": event["stage"], "file": key[1], "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                        "records": 0, "bytes_read": 0, "peak_rss_mb": 0.0})
+        group["calls"] += 1
+        group["wall_s"] += event["wall_s"]
+        group["cpu_s"] += event["cpu_s"]
+        group["records"] += event["records"]
+        group["bytes_read"] += event["bytes_read"] or 0
+        group["peak_rss_mb"] = max(group["peak_rss_mb"], event["peak_rss_mb"])
+    for group in groups.values():
+        wall = group["wall_s"]
+        group["records_per_s"] = group["records"] / wall if wall > 0 else None
+        group["mb_per_s"] = group["bytes_read"] / wall / 1e6 if wall > 0 else None
+    return list(groups.values())
+
+
+def format_summary(rows):
+    """Render summarize() rows as a fixed-width text table."""
+    labels = [row["stage"] if row["file"] is None else f"{row['stage']} {os.path.basename(row['file'])}" for row in rows]
+    width = max([len("stage")] + [len(label) for label in labels])
+    lines = [f"{'stage':<{width}} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'records':>12} {'records/s':>12} {'MB read':>9} {'MB/s':>8} {'peak RSS MB':>11}"]
+    for label, row in zip(labels, rows):
+        rate = f"{row['records_per_s']:,.0f}" if row["records_per_s"] else "-"
+        throughput = f"{row['mb_per_s']:.1f}" if row["mb_per_s"] else "-"
+        lines.append(f"{label:<{width}} {row['calls']:>6} {row['wall_s']:>9.3f} {row['cpu_s']:>9.3f} {row['records']:>12,} {rate:>12} "
+                     f"{row['bytes_read'] / 1e6:>9.1f} {throughput:>8} {row['peak_rss_mb']:>11.1f}")
+    return "\n".join(lines)
+
+
+def write_summary(path, rows):
+    """Write summarize() rows as a CSV table."""
+    import pandas as pd
+    from truth_cache import atomic_write
+    table = pd.DataFrame(rows, columns=["stage", "file", "calls", "wall_s", "cpu_s", "records", "records_per_s", "bytes_read", "mb_per_s", "peak_rss_mb"])
+    atomic_write(path, lambda handle: handle.write(table.to_csv(index=False).encode()))
+
+
+def finish(summary_path=None, by_file=False):
+    """Disable telemetry, print the summary table of the run and optionally write it as CSV."""
+    path = _telemetry.path if _telemetry else None
+    run_id = disable()
+    if run_id is None:
+        return None
+    rows = summarize(read_events(path, run_id), by_file)
+    print(format_summary(rows))
+    if summary_path:
+        write_summary(summary_path, rows)
+        print(f"Telemetry summary saved to {summary_path}")
+    return rows
+
+
+def add_telemetry_arguments(parser):
+    """Add the common --telemetry/--profile-stage/--profile-mode options to a parser."""
+    parser.add_argument("--telemetry", metavar="JSONL", help="append per-stage telemetry to this JSON-lines file")
+    parser.add_argument("--profile-stage", help="profile every run of this stage (with --telemetry)")
+    parser.add_argument("--profile-mode", choices=PROFILE_MODES, default="cprofile", help="profiler for --profile-stage (default: %(default)s)")
+    return parser
+
+
+def enable_from_arguments(args):
+    """Enable telemetry if --telemetry was given."""
+    if args.telemetry:
+        enable(args.telemetry, args.profile_stage, args.profile_mode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a telemetry JSON-lines file.")
+    parser.add_argument("path", help="telemetry file")
+    parser.add_argument("--run", help="only this run id (default: the last run in the file)")
+    parser.add_argument("--all-runs", action="store_true", help="aggregate every run in the file")
+    parser.add_argument("--by-file", action="store_true", help="one row per stage and input file")
+    parser.add_argument("--csv", help="also write the summary table to this CSV")
+    args = parser.parse_args()
+
+    events = read_events(args.path)
+    if not events:
+        parser.error(f"no telemetry events in {args.path}")
+    if not args.all_runs:
+        run_id = args.run or events[-1]["run"]
+        events = [event for event in events if event["run"] == run_id]
+        print(f"Run {run_id}")
+    rows = summarize(events, args.by_file)
+    print(format_summary(rows))
+    if args.csv:
+        write_summary(args.csv, rows)
+        print(f"Telemetry summary saved to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
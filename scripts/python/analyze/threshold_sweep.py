@@ -0,0 +1,155 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import calculate_metrics
+from binary_matrix import pipeline_name
+from pipeline_metrics import parse_pipeline_config, safe_divide
+from variant_keys import contains
+from vcf_scanner import scan_field
+
+# Precision-recall curves over a caller score threshold. Each pipeline VCF is
+# scanned once for its keys and score, matched against each truth set once,
+# and sorted once by descending score; the TP/FP counts at every threshold
+# are then cumulative sums, instead of re-filtering and re-evaluating the VCF
+# once per cutoff.
+
+# Score field per caller: "QUAL", "INFO/<key>" or "FORMAT/<key>" of the tumor sample
+DEFAULT_SCORE_FIELDS = {
+    "mutect": "INFO/TLOD",
+    "strelka": "INFO/SomaticEVS",
+    "somaticsniper": "FORMAT/SSC",
+}
+TUMOR_SAMPLE = "tumor"
+
+
+def score_field_for(vcf_path):
+    """Return the default score field of a pipeline VCF, chosen by its caller."""
+    caller = parse_pipeline_config(vcf_path)["Caller"]
+    return DEFAULT_SCORE_FIELDS.get(caller, "QUAL")
+
+
+def unique_max_scores(keys, scores):
+    """De-duplicate variant keys, keeping the highest score of each (missing scores rank lowest)."""
+    ranked = np.where(np.isnan(scores), -np.inf, scores)
+    order = np.lexsort((ranked, keys))
+    keys, ranked = keys[order], ranked[order]
+    last = np.append(keys[1:] != keys[:-1], True) if len(keys) else np.zeros(0, dtype=bool)
+    return keys[last], ranked[last]
+
+
+def sweep_curve(scores, is_tp, n_truth):
+    """Return the TP/FP/FN, precision, recall and F1 of every distinct "score >= threshold" cutoff.
+
+    Records without a score have a threshold of -inf, i.e. they are only kept
+    by the last (unfiltered) row of the curve.
+    """
+    order = np.argsort(-scores, kind="stable")
+    scores, is_tp = scores[order], is_tp[order]
+    tp = np.cumsum(is_tp, dtype=np.int64)
+    fp = np.arange(1, len(scores) + 1) - tp
+    # The last record of each run of equal scores closes that threshold.
+    last = np.append(scores[1:] != scores[:-1], True) if len(scores) else np.zeros(0, dtype=bool)
+    tp, fp, thresholds = tp[last], fp[last], scores[last]
+    fn = n_truth - tp
+    precision = safe_divide(tp, tp + fp)
+    recall = safe_divide(tp, tp + fn)
+    return pd.DataFrame({
+        "Threshold": thresholds, "TP": tp, "FP": fp, "FN": fn,
+        "Precision": precision, "Recall": recall, "F1": safe_divide(2 * precision * recall, precision + recall),
+    })
+
+
+def summarize_curve(curve):
+    """Return the best-F1 threshold, the unfiltered F1 and the area under the precision-recall curve."""
+    if curve.empty:
+        return {"Best_Threshold": np.nan, "Best_F1": 0.0, "Best_Precision": 0.0, "Best_Recall": 0.0, "Unfiltered_F1": 0.0, "PR_AUC": 0.0}
+    best = curve.loc[curve["F1"].idxmax()]
+    recall = curve["Recall"].to_numpy()
+    # Step-wise area (average precision): each recall increment at the precision reached there.
+    auc = float(np.sum(np.diff(np.concatenate([[0.0], recall])) * curve["Precision"].to_numpy()))
+    return {
+        "Best_Threshold": best["Threshold"], "Best_F1": best["F1"],
+        "Best_Precision": best["Precision"], "Best_Recall": best["Recall"],
+        "Unfiltered_F1": curve["F1"].iloc[-1], "PR_AUC": auc,
+    }
+
+
+def sweep_pipeline(vcf_path, truth_keys_by_type, score_field=None, tumor_sample=TUMOR_SAMPLE):
+    """Return {variant type: curve} for one pipeline VCF against every truth key array."""
+    score_field = score_field or score_field_for(vcf_path)
+    print(f"Scanning {score_field} from {vcf_path}")
+    keys, scores = scan_field(vcf_path, score_field, tumor_sample)
+    keys, scores = unique_max_scores(keys, scores)
+    inside = calculate_metrics.target_mask(keys)
+    keys, scores = keys[inside], scores[inside]
+    curves = {}
+    for variant_type, truth_keys in truth_keys_by_type.items():
+        curve = sweep_curve(scores, contains(truth_keys, keys), len(truth_keys))
+        curve.insert(0, "Score_Field", score_field)
+        curves[variant_type] = curve
+    return curves
+
+
+def sweep_pipelines(vcf_paths, truth_paths, score_field=None, tumor_sample=TUMOR_SAMPLE):
+    """Sweep every pipeline against every truth set; return (curve table, summary table)."""
+    truth_keys = {
+        variant_type: calculate_metrics.restrict_to_targets(calculate_metrics.load_truth_variants(path))
+        for variant_type, path in truth_paths.items()
+    }
+    curves, summaries = [], []
+    for vcf_path in vcf_paths:
+        pipeline = pipeline_name(vcf_path)
+        for variant_type, curve in sweep_pipeline(vcf_path, truth_keys, score_field, tumor_sample).items():
+            curves.append(curve.assign(Pipeline=pipeline, Variant_Type=variant_type))
+            summary = summarize_curve(curve)
+            summaries.append({"Pipeline": pipeline, "Variant_Type": variant_type, "Score_Field": curve["Score_Field"].iloc[0] if len(curve) else score_field, **summary})
+            print(f"{pipeline} {variant_type}: best F1={summary['Best_F1']:.3f} at >= {summary['Best_Threshold']}, PR AUC={summary['PR_AUC']:.3f}")
+    curve_table = pd.concat(curves, ignore_index=True)
+    curve_table = curve_table[["Pipeline", "Variant_Type"] + [column for column in curve_table if column not in ("Pipeline", "Variant_Type")]]
+    return curve_table, pd.DataFrame(summaries)
+
+
+def plot_curves(curve_table, summary_table):
+    """Plot the precision-recall curve of every pipeline, one panel per variant type, best-F1 points marked."""
+    # Imported here so the sweeps themselves do not need matplotlib.
+    import matplotlib.pyplot as plt
+    variant_types = list(dict.fromkeys(curve_table["Variant_Type"]))
+    fig, axes = plt.subplots(1, len(variant_types), figsize=(8 * len(variant_types), 7), squeeze=False)
+    for ax, variant_type in zip(axes[0], variant_types):
+        for pipeline, curve in curve_table[curve_table["Variant_Type"] == variant_type].groupby("Pipeline", sort=False):
+            line, = ax.step(curve["Recall"], curve["Precision"], where="post", label=pipeline)
+            best = summary_table[(summary_table["Pipeline"] == pipeline) & (summary_table["Variant_Type"] == variant_type)].iloc[0]
+            ax.plot(best["Best_Recall"], best["Best_Precision"], "o", color=line.get_color())
+        ax.set_title(f"{variant_type} Precision-Recall over Score Thresholds")
+        ax.set_xlabel("Recall")
+        ax.set_ylabel("Precision")
+        ax.set_xlim(0, 1)
+        ax.set_ylim(0, 1.02)
+        ax.legend(fontsize="small")
+    fig.tight_layout()
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep caller score thresholds and compute precision-recall curves.")
+    parser.add_argument("vcfs", nargs="*", help="pipeline VCFs (default: files_to_process of calculate_metrics.py)")
+    parser.add_argument("--score", help="score field for every VCF: QUAL, INFO/<key> or FORMAT/<key> (default: per caller)")
+    parser.add_argument("--tumor-sample", default=TUMOR_SAMPLE, help="sample read by FORMAT/<key> scores (default: %(default)s)")
+    parser.add_argument("--truth", action="append", metavar="TYPE=VCF",
+                        help="truth VCF of a variant type (default: the truth sets of calculate_metrics.py)")
+    parser.add_argument("--out-prefix", default="threshold_sweep", help="write <prefix>_curves.csv, <prefix>_summary.csv and <prefix>.png")
+    args = parser.parse_args()
+
+    vcf_paths = args.vcfs or [os.path.join(calculate_metrics.vcf_directory, file) for file in calculate_metrics.files_to_process]
+    truth_paths = dict(item.split("=", 1) for item in args.truth) if args.truth else calculate_metrics.truth_sets()
+    curve_table, summary_table = sweep_pipelines(vcf_paths, truth_paths, args.score, args.tumor_sample)
+
+    calculate_metrics.write_csv(curve_table, f"{args.out_prefix}_curves.csv")
+    calculate_metrics.write_csv(summary_table, f"{args.out_prefix}_summary.csv")
+    plot_curves(curve_table, summary_table).savefig(f"{args.out_prefix}.png", dpi=300)
+    print(f"Saved {args.out_prefix}_curves.csv, {args.out_prefix}_summary.csv and {args.out_prefix}.png")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from variant_keys import register_contigs, registered_contigs
+
+# Bump whenever the key encoding or the cache layout changes.
+CACHE_VERSION = 2
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_paths(vcf_path, cache_dir=None, tag=None):
+    """Return the (keys, metadata) paths of the cache for a truth VCF; a tag separates differently encoded keys."""
+    cache_dir = cache_dir or os.path.dirname(os.path.abspath(vcf_path))
+    base = os.path.join(cache_dir, os.path.basename(vcf_path) + (f".{tag}" if tag else ""))
+    return base + ".keys.npy", base + ".keys.json"
+
+
+def atomic_write(path, write):
+    """Write a file through a temporary file and rename it into place."""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            write(handle)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _read_metadata(meta_path):
+    try:
+        with open(meta_path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def _source_state(vcf_path):
+    stat = os.stat(vcf_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def is_cache_valid(vcf_path, cache_dir=None, tag=None, params=None):
+    """Check whether the cache of a truth VCF still matches its source file and the key extraction params."""
+    keys_path, meta_path = cache_paths(vcf_path, cache_dir, tag)
+    meta = _read_metadata(meta_path)
+    if meta is None or meta.get("version") != CACHE_VERSION or not os.path.exists(keys_path):
+        return False
+    if meta.get("params") != params:
+        return False
+    state = _source_state(vcf_path)
+    if all(meta.get(field) == value for field, value in state.items()):
+        return True
+    # The file was touched or copied; only rebuild if its content changed.
+    if meta.get("sha256") != file_sha256(vcf_path):
+        return False
+    meta.update(state)
+    atomic_write(meta_path, lambda handle: handle.write(json.dumps(meta, indent=2).encode()))
+    return True
+
+
+def build_truth_cache(vcf_path, load_keys, cache_dir=None, tag=None, params=None):
+    """Parse a truth VCF once with load_keys() and store its sorted keys on disk."""
+    keys_path, meta_path = cache_paths(vcf_path, cache_dir, tag)
+    os.makedirs(os.path.dirname(keys_path), exist_ok=True)
+    state = _source_state(vcf_path)
+    keys = np.asarray(load_keys(vcf_path), dtype=np.uint64)
+    meta = {
+        "version": CACHE_VERSION,
+        "source": os.path.abspath(vcf_path),
+        "sha256": file_sha256(vcf_path),
+        "count": int(len(keys)),
+        "params": params,
+        "contigs": registered_contigs(keys),
+        **state,
+    }
+    atomic_write(keys_path, lambda handle: np.save(handle, keys))
+    atomic_write(meta_path, lambda handle: handle.write(json.dumps(meta, indent=2).encode()))
+    print(f"Cached {len(keys)} truth variants from {vcf_path} in {keys_path}")
+    return keys_path
+
+
+def load_truth_keys(vcf_path, load_keys, cache_dir=None, tag=None, params=None):
+    """Return the sorted keys of a truth VCF as a read-only memory map, building the cache if needed.
+
+    params (JSON-serializable) describes how the keys are extracted; a cache
+    built with different params, or whose contig ids clash with the contigs
+    this process has already encoded, is rebuilt.
+    """
+    keys_path, meta_path = cache_paths(vcf_path, cache_dir, tag)
+    if not is_cache_valid(vcf_path, cache_dir, tag, params):
+        print(f"Truth cache for {vcf_path} is missing or stale, rebuilding")
+        build_truth_cache(vcf_path, load_keys, cache_dir, tag, params)
+    elif not register_contigs((_read_metadata(meta_path) or {}).get("contigs", {})):
+        print(f"Truth cache for {vcf_path} numbers its contigs differently from this run, rebuilding")
+        build_truth_cache(vcf_path, load_keys, cache_dir, tag, params)
+    return np.load(keys_path, mmap_mode="r")
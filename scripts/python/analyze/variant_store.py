@@ -0,0 +1,303 @@
+import argparse
+import glob
+import json
+import os
+import re
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from binary_matrix import matrix_from_columns, pipeline_name
+from pipeline_metrics import parse_pipeline_config
+from truth_cache import atomic_write
+from variant_keys import KEY_DTYPE, register_contigs, registered_contigs, to_key_array
+from vcf_scanner import key_encoder, iter_data_lines, read_header
+
+# Columnar store of every pipeline and truth VCF: one Parquet dataset,
+# hive-partitioned as <root>/source=<pipeline|truth>/pipeline=<name>/. Each
+# record keeps its encoded key, the core VCF columns, the pipeline
+# configuration and typed INFO and tumor/normal FORMAT fields, so analyses
+# read the few columns they need (with filters pushed down to the Parquet
+# row groups) instead of re-parsing VCF text.
+
+DEFAULT_VCF_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "Passed_vcfs")
+PART_NAME = "part-0.parquet"
+BATCH_ROWS = 200_000
+SAMPLE_ROLES = {"TUMOR": "tumor", "NORMAL": "normal"}
+
+ARROW_TYPES = {"Integer": pa.int64(), "Float": pa.float64(), "Flag": pa.bool_(), "String": pa.string(), "Character": pa.string()}
+CORE_SCHEMA = [
+    ("key", pa.uint64()), ("CHROM", pa.string()), ("POS", pa.int64()), ("ID", pa.string()),
+    ("REF", pa.string()), ("ALT", pa.string()), ("QUAL", pa.float64()), ("FILTER", pa.string()),
+    ("Mapper", pa.string()), ("Caller", pa.string()), ("Recalibration", pa.string()),
+]
+_DEFINITION = re.compile(r"^##(INFO|FORMAT)=<ID=([^,]+),Number=([^,]+),Type=([^,>]+)")
+
+
+def header_fields(header):
+    """Return the {(INFO|FORMAT, id): (Number, Type)} declarations of a VCF header."""
+    fields = {}
+    for line in header:
+        match = _DEFINITION.match(line)
+        if match:
+            kind, field_id, number, vcf_type = match.groups()
+            fields[(kind, field_id)] = (number, vcf_type)
+    return fields
+
+
+def _converter(number, vcf_type):
+    """Return (arrow type, bytes -> value) for a declared field.
+
+    Number=1 and Number=A fields become scalars (the first ALT for A; the
+    callers emit one ALT per record), other numeric fields become lists.
+    """
+    arrow_type = ARROW_TYPES.get(vcf_type, pa.string())
+    if arrow_type == pa.string():
+        return arrow_type, lambda value: value.decode()
+    if vcf_type == "Flag":
+        return arrow_type, lambda value: True
+    cast = int if vcf_type == "Integer" else float
+
+    def parse(part):
+        return None if part in (b"", b".") else cast(part)
+
+    if number in ("1", "A"):
+        return arrow_type, lambda value: parse(value.split(b",", 1)[0])
+    return pa.list_(arrow_type), lambda value: [parse(part) for part in value.split(b",")]
+
+
+def _sample_columns(header):
+    """Return {TUMOR/NORMAL: column index} of a VCF (by sample name, else NORMAL first and TUMOR last)."""
+    columns = header[-1].split("\t")
+    samples = {name.lower(): i for i, name in enumerate(columns[9:], start=9)}
+    if not samples:
+        return {}
+    found = {role: samples[name] for role, name in SAMPLE_ROLES.items() if name in samples}
+    if len(samples) >= 2:
+        found.setdefault("TUMOR", len(columns) - 1)
+        found.setdefault("NORMAL", 9)
+    else:
+        found.setdefault("TUMOR", 9)
+    return found
+
+
+def vcf_schema(header):
+    """Return the Arrow schema of a VCF's store partition and the converters of its INFO/FORMAT columns."""
+    fields = header_fields(header)
+    schema = list(CORE_SCHEMA)
+    info, sample = [], []
+    for (kind, field_id), (number, vcf_type) in sorted(fields.items()):
+        if kind != "INFO":
+            continue
+        arrow_type, convert = _converter(number, vcf_type)
+        schema.append((f"INFO_{field_id}", arrow_type))
+        info.append((f"INFO_{field_id}", field_id.encode(), convert, vcf_type == "Flag"))
+    for role, column in sorted(_sample_columns(header).items()):
+        for (kind, field_id), (number, vcf_type) in sorted(fields.items()):
+            if kind != "FORMAT":
+                continue
+            arrow_type, convert = _converter(number, vcf_type)
+            schema.append((f"{role}_{field_id}", arrow_type))
+            sample.append((f"{role}_{field_id}", column, field_id.encode(), convert))
+    return pa.schema(schema), info, sample
+
+
+def iter_record_batches(vcf_path, schema, info, sample, batch_rows=BATCH_ROWS):
+    """Parse a VCF once into Arrow record batches of the given schema."""
+    config = parse_pipeline_config(vcf_path)
+    encode = key_encoder()
+    columns = {name: [] for name in schema.names}
+    rows = 0
+    for line in iter_data_lines(vcf_path):
+        fields = line.rstrip(b"\r").split(b"\t")
+        chrom, pos, variant_id, ref, alt, qual, filters = fields[:7]
+        columns["key"].append(encode(chrom, pos, ref, alt))
+        columns["CHROM"].append(chrom.decode())
+        columns["POS"].append(int(pos))
+        columns["ID"].append(None if variant_id == b"." else variant_id.decode())
+        columns["REF"].append(ref.decode())
+        columns["ALT"].append("" if alt == b"." else alt.decode())
+        columns["QUAL"].append(None if qual == b"." else float(qual))
+        columns["FILTER"].append(None if filters == b"." else filters.decode())
+        for field in ("Mapper", "Caller", "Recalibration"):
+            columns[field].append(config[field])
+
+        entries = {}
+        if len(fields) > 7 and fields[7] != b".":
+            for entry in fields[7].split(b";"):
+                name, has_value, value = entry.partition(b"=")
+                entries[name] = value if has_value else True
+        for column, field_id, convert, is_flag in info:
+            value = entries.get(field_id)
+            if is_flag:
+                columns[column].append(value is not None)
+            else:
+                columns[column].append(None if value is None or value is True else convert(value))
+
+        if sample:
+            format_keys = fields[8].split(b":") if len(fields) > 8 else []
+            values_by_column = {}
+            for column, sample_column, field_id, convert in sample:
+                values = values_by_column.get(sample_column)
+                if values is None:
+                    raw = fields[sample_column].split(b":") if sample_column < len(fields) else []
+                    values = values_by_column[sample_column] = dict(zip(format_keys, raw))
+                value = values.get(field_id)
+                columns[column].append(None if value is None or value == b"." else convert(value))
+
+        rows += 1
+        if rows == batch_rows:
+            yield pa.RecordBatch.from_pydict(columns, schema=schema)
+            columns = {name: [] for name in schema.names}
+            rows = 0
+    if rows:
+        yield pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+def partition_path(root, name, source="pipeline"):
+    """Return the Parquet file of one pipeline (or truth set) in the store."""
+    return os.path.join(root, f"source={source}", f"pipeline={name}", PART_NAME)
+
+
+def _source_metadata(vcf_path):
+    stat = os.stat(vcf_path)
+    return {b"source_path": os.path.abspath(vcf_path).encode(), b"source_size": str(stat.st_size).encode(),
+            b"source_mtime_ns": str(stat.st_mtime_ns).encode()}
+
+
+def is_partition_current(vcf_path, parquet_path):
+    """Return True if a partition was ingested from the VCF as it is now (same size and mtime)."""
+    try:
+        metadata = pq.read_schema(parquet_path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    current = _source_metadata(vcf_path)
+    if _partition_contigs(parquet_path) is None:
+        return False
+    return all(metadata.get(field) == current[field] for field in (b"source_size", b"source_mtime_ns"))
+
+
+def _partition_contigs(parquet_path):
+    # The {name: id} of the partition's non-primary contigs, written when its keys were encoded.
+    try:
+        contigs = (pq.read_metadata(parquet_path).metadata or {}).get(b"contigs")
+    except (OSError, pa.ArrowInvalid):
+        return None
+    return None if contigs is None else json.loads(contigs)
+
+
+def _partition_keys(rows, parquet_path):
+    """Return the key column of a partition's rows, encoding them again if the partition's contig ids clash with this process."""
+    contigs = _partition_contigs(parquet_path)
+    if contigs is not None and register_contigs(contigs):
+        return rows["key"].to_numpy(dtype=np.uint64)
+    encode = key_encoder()
+    return np.array([encode(chrom.encode(), pos, ref.encode(), alt.encode())
+                     for chrom, pos, ref, alt in zip(rows["CHROM"], rows["POS"], rows["REF"], rows["ALT"])], dtype=KEY_DTYPE)
+
+
+def ingest_vcf(vcf_path, root, source="pipeline", name=None, force=False):
+    """Convert one VCF into its store partition (skipped if it is up to date); return the partition path."""
+    name = name or pipeline_name(vcf_path)
+    path = partition_path(root, name, source)
+    if not force and is_partition_current(vcf_path, path):
+        print(f"Up to date: {name}")
+        return path
+    print(f"Ingesting {vcf_path} as {source}={name}")
+    schema, info, sample = vcf_schema(read_header(vcf_path))
+    schema = schema.with_metadata(_source_metadata(vcf_path))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(handle):
+        contigs = {}
+        with pq.ParquetWriter(handle, schema, compression="zstd") as writer:
+            for batch in iter_record_batches(vcf_path, schema, info, sample):
+                writer.write_batch(batch)
+                contigs.update(registered_contigs(batch.column("key").to_numpy()))
+            writer.add_key_value_metadata({b"contigs": json.dumps(contigs).encode()})
+
+    atomic_write(path, write)
+    return path
+
+
+def open_store(root):
+    """Open the store as one pyarrow dataset whose schema is the union of every partition's columns."""
+    files = sorted(glob.glob(os.path.join(root, "source=*", "pipeline=*", "*.parquet")))
+    if not files:
+        raise ValueError(f"No variant store partitions under {root} (run variant_store.py ingest first)")
+    partition_schema = pa.schema([("source", pa.string()), ("pipeline", pa.string())])
+    schema = pa.unify_schemas([pq.read_schema(path).remove_metadata() for path in files] + [partition_schema],
+                              promote_options="permissive")
+    return ds.dataset(root, schema=schema, format="parquet", partitioning="hive")
+
+
+def query(root, columns=None, filter=None, source="pipeline", pipelines=None):
+    """Read selected columns of the store as a DataFrame.
+
+    filter is a pyarrow.dataset expression (e.g. ds.field("FILTER") == "PASS");
+    it and the source/pipelines selection are pushed down to the partitions
+    and Parquet row groups, so only matching data is read.
+    """
+    expression = ds.field("source") == source
+    if pipelines is not None:
+        expression &= ds.field("pipeline").isin(list(pipelines))
+    if filter is not None:
+        expression &= filter
+    return open_store(root).to_table(columns=columns, filter=expression).to_pandas()
+
+
+def list_pipelines(root, source="pipeline"):
+    """Return the names of the pipelines (or truth sets) in the store."""
+    paths = glob.glob(partition_path(glob.escape(root), "*", source))
+    return sorted(os.path.basename(os.path.dirname(path)).split("=", 1)[1] for path in paths)
+
+
+def store_keys(root, name, source="pipeline", filter=None):
+    """Return the sorted, unique variant keys of one pipeline (or truth set) in the store."""
+    if name not in list_pipelines(root, source):
+        raise ValueError(f"{source} {name} is not in the variant store {root} (run variant_store.py ingest)")
+    table = query(root, ["key", "CHROM", "POS", "REF", "ALT"], filter, source, [name])
+    return to_key_array(_partition_keys(table, partition_path(root, name, source)))
+
+
+def store_binary_matrix(root, pipelines=None, filter=None):
+    """Build the pipeline x variant VariantMatrix from the store (one scan of five columns)."""
+    pipelines = pipelines or list_pipelines(root)
+    table = query(root, ["pipeline", "key", "CHROM", "POS", "REF", "ALT"], filter, "pipeline", pipelines)
+    groups = dict(tuple(table.groupby("pipeline", sort=False)))
+    file_columns = []
+    for pipeline in pipelines:
+        rows = groups.get(pipeline, table.iloc[:0])
+        keys = _partition_keys(rows, partition_path(root, pipeline, "pipeline"))
+        file_columns.append((keys, rows["CHROM"].to_numpy(dtype=object), rows["POS"].to_numpy(),
+                             rows["REF"].to_numpy(dtype=object), rows["ALT"].to_numpy(dtype=object)))
+    return matrix_from_columns(file_columns, pipelines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar (Parquet) store of the pipeline and truth VCFs.")
+    parser.add_argument("root", help="store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="convert VCFs into store partitions")
+    ingest.add_argument("vcfs", nargs="*", help="pipeline VCFs (default: data/Passed_vcfs/*.vcf)")
+    ingest.add_argument("--truth", action="append", default=[], metavar="VCF", help="truth VCF, stored under source=truth")
+    ingest.add_argument("--force", action="store_true", help="re-ingest VCFs even if unchanged")
+    commands.add_parser("list", help="list the stored pipelines, truth sets and columns")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        vcf_paths = args.vcfs or sorted(glob.glob(os.path.join(DEFAULT_VCF_DIRECTORY, "*.vcf")))
+        for vcf_path in vcf_paths:
+            ingest_vcf(vcf_path, args.root, force=args.force)
+        for vcf_path in args.truth:
+            ingest_vcf(vcf_path, args.root, source="truth", force=args.force)
+    else:
+        for source in ("pipeline", "truth"):
+            for name in list_pipelines(args.root, source):
+                rows = pq.read_metadata(partition_path(args.root, name, source)).num_rows
+                print(f"{source}\t{name}\t{rows} records")
+        print("Columns: " + ", ".join(open_store(args.root).schema.names))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import gzip
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from variant_keys import CONTIG_SHIFT, POS_SHIFT, KEY_DTYPE, MAX_POS, allele_code, contig_id
+
+# A minimal VCF reader that only looks at CHROM, POS, REF and ALT. INFO,
+# FORMAT and sample columns are never split, which is where vcfpy spends most
+# of its time on SomaticSniper and Strelka output.
+
+READ_SIZE = 4 << 20
+BLOCKS_PER_TASK = 64
+DEFAULT_BATCH_SIZE = 1 << 16
+
+_BGZF_HEADER = struct.Struct("<4BI2BH")
+
+
+def is_gzip(path):
+    """Check the gzip magic bytes of a file."""
+    with open(path, "rb") as handle:
+        return handle.read(2) == b"\x1f\x8b"
+
+
+def is_bgzf(path):
+    """Check whether a file starts with a BGZF block (a gzip member with a BC extra field)."""
+    with open(path, "rb") as handle:
+        header = handle.read(18)
+    return len(header) == 18 and header[:4] == b"\x1f\x8b\x08\x04" and header[12:14] == b"BC"
+
+
+def _bgzf_block_size(buffer, offset):
+    """Return the total size of the BGZF block starting at offset, or None if the header is incomplete."""
+    if len(buffer) - offset < _BGZF_HEADER.size:
+        return None
+    id1, id2, _cm, flags, _mtime, _xfl, _os, xlen = _BGZF_HEADER.unpack_from(buffer, offset)
+    if (id1, id2) != (0x1F, 0x8B) or not flags & 4:
+        raise ValueError("Not a BGZF block")
+    extra_start = offset + _BGZF_HEADER.size
+    if len(buffer) < extra_start + xlen:
+        return None
+    pos = extra_start
+    while pos < extra_start + xlen:
+        subfield, sublen = buffer[pos:pos + 2], struct.unpack_from("<H", buffer, pos + 2)[0]
+        if subfield == b"BC":
+            return struct.unpack_from("<H", buffer, pos + 4)[0] + 1
+        pos += 4 + sublen
+    raise ValueError("BGZF block without a BC field")
+
+
+def _inflate_blocks(blocks):
+    """Inflate a list of raw BGZF blocks and return the concatenated payload."""
+    out = []
+    for block in blocks:
+        xlen = struct.unpack_from("<H", block, 10)[0]
+        out.append(zlib.decompress(block[12 + xlen:-8], -15))
+    return b"".join(out)
+
+
+def _iter_bgzf_block_groups(path):
+    """Split a BGZF file into groups of complete raw blocks."""
+    with open(path, "rb") as handle:
+        buffer = b""
+        group = []
+        while True:
+            data = handle.read(READ_SIZE)
+            buffer = buffer + data
+            offset = 0
+            while True:
+                size = _bgzf_block_size(buffer, offset)
+                if size is None or offset + size > len(buffer):
+                    break
+                group.append(buffer[offset:offset + size])
+                offset += size
+                if len(group) == BLOCKS_PER_TASK:
+                    yield group
+                    group = []
+            buffer = buffer[offset:]
+            if not data:
+                break
+        if buffer:
+            raise ValueError(f"Truncated BGZF block at the end of {path}")
+        if group:
+            yield group
+
+
+def iter_bgzf_chunks(path, workers=None):
+    """Yield the decompressed contents of a BGZF file, inflating blocks on a thread pool."""
+    workers = workers or min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for group in _iter_bgzf_block_groups(path):
+            pending.append(executor.submit(_inflate_blocks, group))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_chunks(path, workers=None):
+    """Yield the decompressed contents of a plain, gzip or BGZF file in chunks."""
+    if is_bgzf(path):
+        yield from iter_bgzf_chunks(path, workers)
+        return
+    opener = gzip.open if is_gzip(path) else open
+    with opener(path, "rb") as handle:
+        while True:
+            data = handle.read(READ_SIZE)
+            if not data:
+                break
+            yield data
+
+
+def iter_lines(path, workers=None):
+    """Yield the lines (as bytes, without newline) of a plain, gzip or BGZF file."""
+    tail = b""
+    for chunk in iter_chunks(path, workers):
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def iter_data_lines(path, workers=None):
+    """Yield the record lines of a VCF file, skipping header and empty lines."""
+    for line in iter_lines(path, workers):
+        if line and line[:1] != b"#":
+            yield line.rstrip(b"\r")
+
+
+def read_header(path):
+    """Return the header lines of a VCF file as strings."""
+    header = []
+    for line in iter_lines(path, workers=1):
+        if line[:1] != b"#":
+            break
+        header.append(line.decode().rstrip("\r"))
+    return header
+
+
+def split_core(line):
+    """Split a record line into CHROM, POS, REF and ALT strings (missing ALT becomes "")."""
+    chrom, pos, _id, ref, alt = line.split(b"\t", 5)[:5]
+    alt = b"" if alt == b"." else alt
+    return chrom.decode(), int(pos), ref.decode(), alt.decode()
+
+
+def iter_records(path, workers=None):
+    """Yield (CHROM, POS, REF, ALT) tuples from a VCF file."""
+    for line in iter_data_lines(path, workers):
+        yield split_core(line)
+
+
+def key_encoder():
+    """Return a function that encodes byte-string CHROM, POS, REF, ALT columns into keys."""
+    contig_bits = {}
+    allele_bits = {}
+
+    def encode(chrom, pos, ref, alt):
+        high = contig_bits.get(chrom)
+        if high is None:
+            high = contig_bits[chrom] = contig_id(chrom.decode()) << CONTIG_SHIFT
+        low = allele_bits.get((ref, alt))
+        if low is None:
+            # Keep the allele cache from growing without bound on indel-heavy files.
+            if len(allele_bits) > 1 << 16:
+                allele_bits.clear()
+            low = allele_bits[(ref, alt)] = allele_code(ref.decode(), "" if alt == b"." else alt.decode())
+        pos = int(pos)
+        if pos > MAX_POS:
+            raise ValueError(f"Position {pos} on {chrom.decode()} does not fit in the key layout")
+        return high | (pos << POS_SHIFT) | low
+
+    return encode
+
+
+def iter_key_batches(path, batch_size=DEFAULT_BATCH_SIZE, workers=None):
+    """Yield uint64 arrays of encoded variant keys from a VCF file."""
+    encode = key_encoder()
+    batch = []
+    append = batch.append
+    for line in iter_data_lines(path, workers):
+        chrom, pos, _id, ref, alt = line.split(b"\t", 5)[:5]
+        append(encode(chrom, pos, ref, alt))
+        if len(batch) >= batch_size:
+            yield np.array(batch, dtype=KEY_DTYPE)
+            batch.clear()
+    if batch:
+        yield np.array(batch, dtype=KEY_DTYPE)
+
+
+def scan_keys(path, workers=None):
+    """Return all encoded keys of a VCF file as one uint64 array (unsorted, with duplicates)."""
+    batches = list(iter_key_batches(path, workers=workers))
+    return np.concatenate(batches) if batches else np.empty(0, dtype=KEY_DTYPE)
+
+
+def scan_variant_columns(path, workers=None):
+    """Return the encoded keys of a VCF file together with its CHROM, POS, REF and ALT columns."""
+    encode = key_encoder()
+    keys, chroms, positions, refs, alts = [], [], [], [], []
+    for line in iter_data_lines(path, workers):
+        chrom, pos, _id, ref, alt = line.split(b"\t", 5)[:5]
+        keys.append(encode(chrom, pos, ref, alt))
+        chroms.append(chrom.decode())
+        positions.append(int(pos))
+        refs.append(ref.decode())
+        alts.append("" if alt == b"." else alt.decode())
+    return np.array(keys, dtype=KEY_DTYPE), chroms, np.array(positions, dtype=np.int64), refs, alts
+
+
+def _parse_number(value):
+    """Return the largest number in a (possibly comma-separated, Number=A) VCF value, NaN if missing."""
+    numbers = [float(part) for part in value.split(b",") if part not in (b"", b".")]
+    return max(numbers) if numbers else np.nan
+
+
+def sample_column(header, sample):
+    """Return the column index of a sample (matched case-insensitively), raising ValueError if it is absent."""
+    columns = header[-1].split("\t")
+    if len(columns) < 10:
+        raise ValueError("VCF has no sample columns")
+    for i, name in enumerate(columns[9:], start=9):
+        if name.lower() == sample.lower():
+            return i
+    raise ValueError(f"No sample {sample!r} in the VCF; available samples: {', '.join(columns[9:])}")
+
+
+def scan_field(path, field, sample="tumor", workers=None):
+    """Return the encoded keys of a VCF file and one numeric value per record.
+
+    field is "QUAL", "INFO/<key>" or "FORMAT/<key>" (read from the given
+    sample). Missing values become NaN; multi-valued fields give their maximum.
+    """
+    kind, _, name = field.partition("/")
+    kind = kind.upper()
+    if kind not in ("QUAL", "INFO", "FORMAT") or (kind != "QUAL" and not name):
+        raise ValueError(f"Unsupported score field {field!r}; use QUAL, INFO/<key> or FORMAT/<key>")
+    name = name.encode()
+    info_prefix = name + b"="
+    column = sample_column(read_header(path), sample) if kind == "FORMAT" else None
+
+    encode = key_encoder()
+    keys, values = [], []
+    for line in iter_data_lines(path, workers):
+        fields = line.rstrip(b"\r").split(b"\t")
+        keys.append(encode(fields[0], fields[1], fields[3], fields[4]))
+        value = b"."
+        if kind == "QUAL":
+            value = fields[5]
+        elif kind == "INFO":
+            for entry in fields[7].split(b";"):
+                if entry.startswith(info_prefix):
+                    value = entry[len(info_prefix):]
+                    break
+        else:
+            format_keys = fields[8].split(b":")
+            if name in format_keys and column < len(fields):
+                sample_values = fields[column].split(b":")
+                index = format_keys.index(name)
+                if index < len(sample_values):
+                    value = sample_values[index]
+        values.append(_parse_number(value))
+    return np.array(keys, dtype=KEY_DTYPE), np.array(values, dtype=np.float64)